@@ -0,0 +1,508 @@
+import argparse
+import gc
+import http.server
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import types
+
+
+class FakeMPV:
+    def __init__(self, buffer_delay=0.02, length=0.5, step=0.02, **options):
+        self.pause = False
+        self.mute = False
+        self.volume = 100
+        self.duration = None
+        self.playback_time = None
+        self.buffer_delay = buffer_delay
+        self.length = length
+        self.step = step
+        self.observers = {}
+        self.handlers = {}
+        self.playlist = []
+        self.pos = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def observe_property(self, name, callback):
+        self.observers.setdefault(name, []).append(callback)
+
+    def event_callback(self, name):
+        def register(func):
+            self.handlers[name] = func
+            return func
+        return register
+
+    def notify(self, name, value):
+        for callback in self.observers.get(name, []):
+            callback(name, value)
+
+    def play(self, url):
+        with self.lock:
+            self.generation += 1
+            self.playlist = [url]
+            self.pos = 0
+            generation = self.generation
+        threading.Thread(target=self.run, args=(generation,), daemon=True).start()
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+            self.playlist = []
+        self.playback_time = None
+        self.notify("time-pos", None)
+
+    def seek(self, position, reference="absolute"):
+        self.playback_time = position
+
+    def playlist_append(self, url):
+        with self.lock:
+            self.playlist.append(url)
+
+    def playlist_clear(self):
+        with self.lock:
+            self.playlist = self.playlist[self.pos:self.pos + 1]
+            self.pos = 0
+
+    def playlist_remove(self, index):
+        with self.lock:
+            del self.playlist[index]
+            if index < self.pos:
+                self.pos -= 1
+            pos = self.pos
+        self.notify("playlist-pos", pos)
+
+    def terminate(self):
+        self.stop()
+
+    def run(self, generation):
+        time.sleep(self.buffer_delay)
+        while True:
+            self.duration = self.length
+            self.notify("duration", self.length)
+            position = 0
+            while position < self.length:
+                time.sleep(self.step)
+                if generation != self.generation:
+                    return
+                if not self.pause:
+                    position += self.step
+                    self.playback_time = position
+                    self.notify("time-pos", position)
+            with self.lock:
+                if generation != self.generation:
+                    return
+                advanced = self.pos + 1 < len(self.playlist)
+                if advanced:
+                    self.pos += 1
+                pos = self.pos
+            if not advanced:
+                break
+            self.end_file()
+            self.notify("playlist-pos", pos)
+        self.playback_time = None
+        self.end_file()
+
+    def end_file(self):
+        handler = self.handlers.get("end-file")
+        if handler is not None:
+            handler(types.SimpleNamespace(data=types.SimpleNamespace(reason=0)))
+
+
+class FakeWidget:
+    def __init__(self):
+        self.handlers = {}
+        self.options = {}
+
+    def bind(self, sequence=None, func=None, add=None):
+        if sequence is None:
+            return tuple(self.handlers)
+        self.handlers.setdefault(sequence, [])
+        if not add:
+            self.handlers[sequence].clear()
+        self.handlers[sequence].append(func)
+
+    def config(self, **options):
+        self.options.update(options)
+
+
+class FakeToolTip:
+    def __init__(self, widget, text="widget info", bootstyle=None):
+        self.widget = widget
+        self.text = text
+        self.bootstyle = bootstyle
+        for sequence in ("<Enter>", "<Leave>", "<Motion>", "<ButtonPress>"):
+            widget.bind(sequence, lambda event: None, add="+")
+
+
+class FakeYoutubeDL:
+    network_delay = 0.05
+
+    def __init__(self, options=None):
+        self.options = options or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=False, process=True):
+        time.sleep(self.network_delay)
+        expire = int(time.time()) + 6 * 3600
+        return {"url": f"https://stream.invalid/{url.rsplit('=', 1)[-1]}?expire={expire}", "title": url, "duration": 180, "format_id": "251"}
+
+
+def install_fakes(network_delay, buffer_delay, length):
+    mpv = types.ModuleType("mpv")
+    mpv.MPV = lambda **options: FakeMPV(buffer_delay=buffer_delay, length=length, **options)
+    mpv.MpvEventEndFile = types.SimpleNamespace(EOF=0)
+    yt_dlp = types.ModuleType("yt_dlp")
+    FakeYoutubeDL.network_delay = network_delay
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+    sys.modules["mpv"] = mpv
+    sys.modules["yt_dlp"] = yt_dlp
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1]
+    }
+
+
+def make_library(size):
+    return {f"Artist {i:06d} - Song": f"https://www.youtube.com/watch?v={i:011d}" for i in range(size)}
+
+
+class Sandbox:
+    def __init__(self, size=0):
+        self.previous = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="music-player-bench-")
+        os.makedirs(os.path.join(self.directory, "assets"))
+        settings = {"lang": "en", "theme": "dark", "shuffle": "shuffle_off", "play_mode": "next_mode", "mute": "mute_off", "volume": 50, "progress_rate": 4, "health_scan": False}
+        with open(os.path.join(self.directory, "assets", "settings.json"), "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+        with open(os.path.join(self.directory, "assets", "url.json"), "w", encoding="utf-8") as f:
+            json.dump(make_library(size), f)
+
+    def __enter__(self):
+        os.chdir(self.directory)
+        return self
+
+    def __exit__(self, *args):
+        os.chdir(self.previous)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def start_daemon(main):
+    started = time.perf_counter()
+    daemon = main.PlayerDaemon()
+    daemon.engine.attach(daemon.engine.player.create(), rate=4)
+    return daemon, (time.perf_counter() - started) * 1000
+
+
+def run_loop(loop, seconds):
+    loop.running = True
+    loop.after(int(seconds * 1000), loop.quit)
+    loop.mainloop()
+
+
+def bench_library(size, repeat):
+    from main import LibraryModel
+
+    data = dict(sorted(make_library(size).items()))
+    model = LibraryModel(data.items())
+    positions = [random.randrange(size) for i in range(repeat)]
+    urls = [model.url_of(model.name_at(pos)) for pos in positions]
+    names = [model.name_at(pos) for pos in positions]
+
+    cases = {
+        "name at position": (
+            lambda: [list(data.keys())[pos] for pos in positions],
+            lambda: [model.name_at(pos) for pos in positions]
+        ),
+        "name for url": (
+            lambda: [list(filter(lambda key: data[key] == url, data))[0] for url in urls],
+            lambda: [model.name_for_url(url) for url in urls]
+        ),
+        "duplicate url check": (
+            lambda: [url in data.values() for url in urls],
+            lambda: [model.has_url(url) for url in urls]
+        ),
+        "position of name": (
+            lambda: [list(data.keys()).index(name) for name in names],
+            lambda: [model.index_of(name) for name in names]
+        )
+    }
+    results = {}
+    for case, (old, new) in cases.items():
+        results[case] = {"old_us": timeit.timeit(old, number=1) / repeat * 1e6, "new_us": timeit.timeit(new, number=1) / repeat * 1e6}
+    return results
+
+
+def bench_library_ops(sizes, repeat):
+    import main
+
+    results = {}
+    for size in sizes:
+        with Sandbox(size):
+            storage = main.Storage(main.DB_FILE)
+            data = main.FileHandling(main.URL_FILE, storage)
+            names = [f"Zz bench {i:06d}" for i in range(repeat)]
+            add = timeit.timeit(lambda: [data.add_new(name, f"https://youtu.be/{i:011d}") for i, name in enumerate(names)], number=1)
+            rename = timeit.timeit(lambda: [data.change_name(name + " (renamed)", name) for name in names], number=1)
+            remove = timeit.timeit(lambda: [data.remove(data.model.index_of(name + " (renamed)")) for name in names], number=1)
+            storage.close()
+        results[str(size)] = {"add_new_us": add / repeat * 1e6, "change_name_us": rename / repeat * 1e6, "remove_us": remove / repeat * 1e6}
+    return results
+
+
+def bench_startup(size, repeat):
+    import main
+
+    samples = []
+    with Sandbox(size):
+        daemon, first = start_daemon(main)
+        daemon.shutdown()
+        for i in range(repeat):
+            daemon, elapsed = start_daemon(main)
+            samples.append(elapsed)
+            daemon.shutdown()
+    return {"library_size": size, "import_ms": (main.IMPORT_END - main.IMPORT_START) * 1000, "first_start_ms": first, "start_ms": percentiles(samples)}
+
+
+def bench_playback(size, tracks, length):
+    import main
+
+    with Sandbox(size):
+        daemon, elapsed = start_daemon(main)
+        engine = daemon.engine
+        loop = daemon.loop
+        names = [daemon.library.name_at(i) for i in range(tracks)]
+        pending = [("cold", name) for name in names] + [("warm", name) for name in names]
+        latencies = {"cold": [], "warm": []}
+        current = {}
+
+        def play_next():
+            if not pending:
+                loop.quit()
+                return
+            kind, name = pending.pop(0)
+            current.update(kind=kind, started=time.perf_counter())
+            engine.play(name)
+
+        def on_time_pos(name, time_pos):
+            if time_pos and "started" in current:
+                latencies[current.pop("kind")].append((time.perf_counter() - current.pop("started")) * 1000)
+                loop.after(0, play_next)
+
+        engine.player.observe_property("time-pos", on_time_pos)
+        engine.play_mode = "stop"
+        loop.after(0, play_next)
+        loop.mainloop()
+
+        engine.play_mode = "next"
+        loop.after(0, lambda: engine.play(names[0]))
+        run_loop(loop, (tracks + 1) * length)
+        gaps = list(engine.transitions.gaps)
+        hit_ratio = daemon.cache_data.hit_ratio()
+        daemon.shutdown()
+    return {
+        "play_to_first_audio_cold_ms": percentiles(latencies["cold"]),
+        "play_to_first_audio_warm_ms": percentiles(latencies["warm"]),
+        "transition_gap_ms": percentiles(gaps),
+        "cache_hit_ratio": hit_ratio
+    }
+
+
+def bench_idle(size, seconds):
+    import main
+
+    results = {}
+    with Sandbox(size):
+        daemon, elapsed = start_daemon(main)
+        daemon.engine.player.length = seconds * 4
+        loop = daemon.loop
+        schedule = loop.after
+        wakeups = [0]
+
+        def counted(delay, func):
+            def run():
+                wakeups[0] += 1
+                func()
+            return schedule(delay, run)
+
+        loop.after = counted
+        for state in ("stopped", "playing", "paused"):
+            if state == "playing":
+                loop.after(0, lambda: daemon.engine.play(daemon.library.name_at(0)))
+                run_loop(loop, 0.3)
+            elif state == "paused":
+                loop.after(0, daemon.engine.pause)
+                run_loop(loop, 0.1)
+            wakeups[0] = 0
+            cpu = time.process_time()
+            run_loop(loop, seconds)
+            results[state] = {"loop_wakeups_per_s": (wakeups[0] - 1) / seconds, "cpu_ms_per_s": (time.process_time() - cpu) * 1000 / seconds}
+        loop.after = schedule
+        daemon.shutdown()
+    return results
+
+
+def bench_tooltips(updates):
+    import main
+
+    main.ToolTip = FakeToolTip
+    translations = {"pl": {"select": "Wybierz", "play": "Odtwarzaj", "pause": "Pauza", "mute_on": "Wycisz", "mute_off": "Dzwiek", "shuffle_on": "Losowo", "shuffle_off": "Po kolei"}}
+    translations["en"] = {key: key for key in translations["pl"]}
+    registry = main.WidgetRegistry(translations, "pl", "dark")
+    widgets = {name: FakeWidget() for name in ("title", "play", "mute", "shuffle")}
+    for widget in widgets.values():
+        registry.themed(widget)
+
+    def snapshot():
+        gc.collect()
+        return {
+            "tooltips": len(registry.tips),
+            "tooltip_objects": sum(1 for obj in gc.get_objects() if isinstance(obj, FakeToolTip)),
+            "sequences": sorted({sequence for widget in widgets.values() for sequence in widget.bind()}),
+            "handlers": sum(len(handlers) for widget in widgets.values() for handlers in widget.handlers.values())
+        }
+
+    checkpoints = []
+    started = time.perf_counter()
+    for i in range(updates):
+        registry.tooltip(widgets["title"], text=f"Artist {i:06d} - Song")
+        registry.tooltip(widgets["play"], "pause" if i % 2 else "play")
+        registry.tooltip(widgets["mute"], "mute_on" if i % 3 else "mute_off")
+        registry.tooltip(widgets["shuffle"], "shuffle_on" if i % 5 else "shuffle_off")
+        if i % 100 == 0:
+            registry.update(language=("pl", "en")[i // 100 % 2], bootstyle=("dark", "info")[i // 100 % 2])
+        if i % (max(1, updates // 10)) == 0:
+            checkpoints.append(snapshot())
+    elapsed = time.perf_counter() - started
+    final = snapshot()
+    for checkpoint in checkpoints:
+        assert checkpoint == final, f"tooltip state grew during the session: {checkpoint} -> {final}"
+    return {"updates": updates, "update_us": elapsed / (updates * 4) * 1e6, "checkpoints": len(checkpoints), **final}
+
+
+def serve_audio(directory):
+    handler = lambda *args: http.server.SimpleHTTPRequestHandler(*args, directory=directory)
+    http.server.SimpleHTTPRequestHandler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_extractor(repeat):
+    import yt_dlp
+    from main import ExtractorPool
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "song.mp3"), "wb") as file:
+            file.write(b"ID3" + bytes(4096))
+        server = serve_audio(directory)
+        url = f"http://127.0.0.1:{server.server_address[1]}/song.mp3"
+        pool = ExtractorPool()
+
+        def per_call():
+            with yt_dlp.YoutubeDL(dict(ExtractorPool.PROFILES["stream"])) as ydl:
+                ydl.extract_info(url, download=False)
+
+        def pooled():
+            with pool.session("stream") as ydl:
+                ydl.extract_info(url, download=False)
+
+        pooled()
+        results = {
+            "extract info": {"old_us": timeit.timeit(per_call, number=repeat) / repeat * 1e6, "new_us": timeit.timeit(pooled, number=repeat) / repeat * 1e6}
+        }
+        pool.close()
+        server.shutdown()
+    return results
+
+
+def print_text(results):
+    for suite, data in results.items():
+        if suite == "meta":
+            continue
+        print(f"[{suite}]")
+        for case, value in data.items():
+            if isinstance(value, dict) and "old_us" in value:
+                print(f"  {case:<22} old {value['old_us']:>12.1f} us   new {value['new_us']:>10.2f} us   x{value['old_us'] / value['new_us']:,.1f}")
+            else:
+                print(f"  {case:<30} {json.dumps(value)}")
+
+
+SUITES = ["library", "library-ops", "startup", "playback", "idle", "tooltips", "extractor"]
+FAKE_SUITES = {"library-ops", "startup", "playback", "idle"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Music Player benchmarks")
+    parser.add_argument("--suite", nargs="+", choices=SUITES + ["all"], default=["library"], help="'all' runs every suite except extractor, which needs the real yt-dlp")
+    parser.add_argument("--size", type=int, default=50000, help="library size for the lookup suite")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000], help="library sizes for the library-ops suite")
+    parser.add_argument("--startup-size", type=int, default=10000)
+    parser.add_argument("--tracks", type=int, default=5, help="tracks played in the playback suite")
+    parser.add_argument("--network-delay", type=float, default=50, help="fake yt-dlp extraction delay in ms")
+    parser.add_argument("--buffer-delay", type=float, default=20, help="fake mpv delay before the first audio in ms")
+    parser.add_argument("--track-length", type=float, default=0.5, help="fake stream duration in seconds")
+    parser.add_argument("--idle-seconds", type=float, default=2)
+    parser.add_argument("--tooltip-updates", type=int, default=20000, help="tooltip changes in the tooltips suite")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    suites = set(args.suite)
+    if "all" in suites:
+        suites = set(SUITES) - {"extractor"}
+    if "extractor" in suites and suites & FAKE_SUITES:
+        parser.error("the extractor suite uses the real yt-dlp and cannot run together with the fake backend suites")
+    if suites & FAKE_SUITES:
+        install_fakes(args.network_delay / 1000, args.buffer_delay / 1000, args.track_length)
+    random.seed(args.seed)
+
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(), "args": vars(args)}}
+    if "library" in suites:
+        results["library"] = bench_library(args.size, args.repeat)
+    if "library-ops" in suites:
+        results["library-ops"] = bench_library_ops(args.sizes, args.repeat)
+    if "startup" in suites:
+        results["startup"] = bench_startup(args.startup_size, 5)
+    if "playback" in suites:
+        results["playback"] = bench_playback(100, args.tracks, args.track_length)
+    if "idle" in suites:
+        results["idle"] = bench_idle(100, args.idle_seconds)
+    if "tooltips" in suites:
+        results["tooltips"] = bench_tooltips(args.tooltip_updates)
+    if "extractor" in suites:
+        results["extractor"] = bench_extractor(args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_text(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,134 +1,2429 @@
+import time
+IMPORT_START = time.perf_counter()
+
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
 import json
-import mpv
-import tkinter as tk
-from tkinter import messagebox
-import ttkbootstrap as ttk
-from ttkbootstrap.constants import *
-from ttkbootstrap.tooltip import ToolTip
+import sqlite3
 import os
 import re
+import gzip
+import shutil
 import locale
-import yt_dlp
-import yt_dlp as ydl
-from PIL import Image
-import time
+import argparse
+import csv
+import struct
 import random
+import bisect
+import heapq
+import signal
+import threading
+import asyncio
+from collections import OrderedDict, deque
+from queue import SimpleQueue
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+IMPORT_END = time.perf_counter()
 
 locale.setlocale(locale.LC_NUMERIC, "C")
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H-%M:%S",
-    filename="log.log"
-)
-
 logger = logging.getLogger(__name__)
 
+LOG_FILE = "log.log"
+
 URL_FILE = "assets/url.json"
 CACHE_FILE = "assets/song_cache.json"
+DB_FILE = "assets/music_player.db"
+AUDIO_DIR = "assets/audio"
 SETTINGS_FILE = "assets/settings.json"
 TRANSLATIONS_FILE = "assets/translations.json"
 ICON_16 = "assets/icon-16.png"
 ICON_32 = "assets/icon-32.png"
 MUSIC_GIF = "assets/music_gif.gif"
 
+YOUTUBE_REGEX = re.compile(r'^(https?://)?(www\.)?(youtube\.com|youtu\.?be)/.+$')
+YOUTUBE_ID = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def compress_log(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup_logging(level="INFO", json_format=False, max_bytes=5 * 1024 * 1024, backups=5):
+    handler = RotatingFileHandler(LOG_FILE, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = compress_log
+    if json_format:
+        handler.setFormatter(JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S"))
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H-%M:%S"))
+    log_queue = SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def short_url(url):
+    return (url or "").split("?", 1)[0]
+
+
+def import_gui():
+    global tk, messagebox, filedialog, tkfont, ttk, ToolTip, INVERSE, CENTER, W, END
+    import tkinter as tk
+    from tkinter import messagebox
+    from tkinter import filedialog
+    from tkinter import font as tkfont
+    import ttkbootstrap as ttk
+    from ttkbootstrap.constants import INVERSE, CENTER, W, END
+    from ttkbootstrap.tooltip import ToolTip
+
+
+def video_id(url):
+    match = YOUTUBE_ID.search(url or "")
+    if match:
+        return match.group(1)
+    return None
+
+
+def track_key(url):
+    return video_id(url) or (url or "").strip()
+
+
+def canonical_url(url):
+    key = video_id(url)
+    if key is None:
+        return (url or "").strip()
+    return f"https://www.youtube.com/watch?v={key}"
+
+
+class Tracer:
+    def __init__(self, size=4096):
+        self.spans = deque(maxlen=size)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, **args):
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, started, time.perf_counter(), args)
+
+    def begin(self, name, **args):
+        with self.lock:
+            self.pending[name] = (time.perf_counter(), args)
+
+    def end(self, name, **args):
+        with self.lock:
+            opened = self.pending.pop(name, None)
+        if opened is None:
+            return None
+        started, data = opened
+        data.update(args)
+        return self.record(name, started, time.perf_counter(), data)
+
+    def cancel(self, *names):
+        with self.lock:
+            for name in names:
+                self.pending.pop(name, None)
+
+    def waiting(self, name):
+        return name in self.pending
+
+    def record(self, name, started, ended, args):
+        self.spans.append((name, started, ended, threading.current_thread().name, args))
+        return (ended - started) * 1000
+
+    def stats(self):
+        durations = {}
+        for name, started, ended, thread, args in list(self.spans):
+            durations.setdefault(name, []).append((ended - started) * 1000)
+        stats = {}
+        for name, samples in sorted(durations.items()):
+            samples.sort()
+            stats[name] = {
+                "count": len(samples),
+                "p50": samples[len(samples) // 2],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "max": samples[-1]
+            }
+        return stats
+
+    def to_json(self):
+        spans = [{"name": name, "start_ms": (started - self.origin) * 1000, "duration_ms": (ended - started) * 1000, "thread": thread, "args": args} for name, started, ended, thread, args in list(self.spans)]
+        return {"stats": self.stats(), "spans": spans}
+
+    def to_chrome_trace(self):
+        threads = {}
+        events = []
+        for name, started, ended, thread, args in list(self.spans):
+            tid = threads.setdefault(thread, len(threads) + 1)
+            events.append({"name": name, "ph": "X", "ts": (started - self.origin) * 1e6, "dur": (ended - started) * 1e6, "pid": os.getpid(), "tid": tid, "args": args})
+        events += [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread}} for thread, tid in threads.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path, chrome=False):
+        data = self.to_chrome_trace() if chrome else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        logger.info(f"Zapisano pomiary wydajnosci do {path}")
+
+
+tracer = Tracer()
+
+
+class Storage:
+    def __init__(self, DB_FILE):
+        self.file = DB_FILE
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS library (name TEXT PRIMARY KEY, url TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cache (url TEXT PRIMARY KEY, data TEXT NOT NULL, used REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS audio (video_id TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS shuffle (pos INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS health (video_id TEXT PRIMARY KEY, available INTEGER NOT NULL, duration REAL, checked REAL NOT NULL)")
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def write(self, sql, params=()):
+        self.write_many([(sql, params)])
+
+    def write_many(self, statements):
+        with tracer.span("db.write", statements=len(statements)), self.lock, self.conn:
+            for sql, params in statements:
+                self.conn.execute(sql, params)
+
+    def get_meta(self, key):
+        row = self.query("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0][0] if row else None
+
+    def set_meta_statement(self, key, value):
+        return ("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class LibraryModel:
+    def __init__(self, items=()):
+        self.urls = dict(items)
+        self.names_by_key = {track_key(url): name for name, url in self.urls.items()}
+        self.names = sorted(self.urls)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.urls
+
+    def items(self):
+        return ((name, self.urls[name]) for name in self.names)
+
+    def index_of(self, name):
+        if name not in self.urls:
+            return None
+        return bisect.bisect_left(self.names, name)
+
+    def name_at(self, pos):
+        return self.names[pos]
+
+    def url_of(self, name):
+        return self.urls[name]
+
+    def has_url(self, url):
+        return track_key(url) in self.names_by_key
+
+    def name_for_url(self, url):
+        return self.names_by_key.get(track_key(url))
+
+    def add(self, name, url):
+        if name in self.urls:
+            self.remove(name)
+        self.urls[name] = url
+        self.names_by_key[track_key(url)] = name
+        pos = bisect.bisect_left(self.names, name)
+        self.names.insert(pos, name)
+        return pos
+
+    def remove(self, name):
+        pos = self.index_of(name)
+        del self.names[pos]
+        url = self.urls.pop(name)
+        key = track_key(url)
+        if self.names_by_key.get(key) == name:
+            del self.names_by_key[key]
+        return pos
+
+    def rename(self, name, new_name):
+        url = self.urls[name]
+        old_pos = self.remove(name)
+        new_pos = self.add(new_name, url)
+        return old_pos, new_pos
+
 
 class FileHandling:
-    def __init__(self, URL_FILE):
+    def __init__(self, URL_FILE, storage):
         self.file = URL_FILE
+        self.storage = storage
+        self.migrate()
+        self.merge_duplicates()
         self.sort()
 
-    def sort(self):
+    def migrate(self):
+        if self.storage.get_meta("library_migrated") or not os.path.exists(self.file):
+            return
         with open(self.file, encoding="utf-8") as f:
             try:
-                self.data = dict(json.load(f))
-                self.data = dict(sorted(self.data.items()))
-            except:
-                self.data = dict()
+                data = dict(json.load(f))
+            except (ValueError, TypeError):
+                logger.exception(f"Nie udalo sie odczytac {self.file}, pomijam migracje")
+                return
+        statements = [("INSERT OR IGNORE INTO library (name, url) VALUES (?, ?)", item) for item in data.items()]
+        statements.append(self.storage.set_meta_statement("library_migrated", "1"))
+        self.storage.write_many(statements)
+        logger.info(f"Przeniesiono {len(data)} utworow z {self.file} do bazy")
+
+    def merge_duplicates(self):
+        if self.storage.get_meta("library_ids_migrated"):
+            return
+        names = {}
+        statements = []
+        for name, url in self.storage.query("SELECT name, url FROM library ORDER BY name"):
+            key = track_key(url)
+            if key in names:
+                logger.info(f"Usunieto duplikat '{name}' utworu '{names[key]}'")
+                statements.append(("DELETE FROM library WHERE name = ?", (name,)))
+                continue
+            names[key] = name
+            if canonical_url(url) != url:
+                statements.append(("UPDATE library SET url = ? WHERE name = ?", (canonical_url(url), name)))
+        statements.append(self.storage.set_meta_statement("library_ids_migrated", "1"))
+        self.storage.write_many(statements)
+        logger.info(f"Ujednolicono linki w bibliotece ({len(statements) - 1} zmian)")
+
+    def sort(self):
+        self.model = LibraryModel(self.storage.query("SELECT name, url FROM library"))
 
     def add_new(self, name, url):
-        self.data[name] = url
-        with open(self.file, 'w', encoding="utf-8") as f:
-            json.dump(self.data, f)
-        self.sort()
+        url = canonical_url(url)
+        self.storage.write("INSERT OR REPLACE INTO library (name, url) VALUES (?, ?)", (name, url))
+        return self.model.add(name, url)
 
     def change_name(self, new_name, name):
-        self.data[new_name] = self.data[name]
-        del self.data[name]
-        with open(self.file, 'w', encoding="utf-8") as f:
-            json.dump(self.data, f)
-        self.sort()
+        self.storage.write("UPDATE library SET name = ? WHERE name = ?", (new_name, name))
+        return self.model.rename(name, new_name)
 
     def remove(self, pos):
-        key_name = [k for i, k in enumerate(self.data) if i == pos]
-        del self.data[key_name[0]]
-        with open(self.file, 'w', encoding="utf-8") as f:
-            json.dump(self.data, f)
+        name = self.model.name_at(pos)
+        self.storage.write("DELETE FROM library WHERE name = ?", (name,))
+        self.model.remove(name)
+        return name
     
+    def add_many(self, tracks):
+        tracks = [(name, canonical_url(url)) for name, url in tracks]
+        self.storage.write_many([("INSERT OR REPLACE INTO library (name, url) VALUES (?, ?)", track) for track in tracks])
+        for name, url in tracks:
+            self.model.add(name, url)
+        return len(tracks)
+
     def show(self):
-        return self.data
+        return dict(self.model.items())
+
+
+class ExtractorPool:
+    PROFILES = {
+        "stream": {'quiet': True, 'no_warnings': True, 'format': 'bestaudio/best', 'noplaylist': True, 'extract_flat': True},
+        "metadata": {'quiet': True, 'no_warnings': True, 'extract_flat': True, 'noplaylist': True},
+        "playlist": {'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist'}
+    }
+
+    def __init__(self, size=4):
+        self.size = size
+        self.condition = threading.Condition()
+        self.idle = {profile: [] for profile in self.PROFILES}
+        self.created = {profile: 0 for profile in self.PROFILES}
+        self.closed = False
+
+    @contextmanager
+    def session(self, profile):
+        ydl = self.acquire(profile)
+        try:
+            yield ydl
+        finally:
+            self.release(profile, ydl)
+
+    def acquire(self, profile):
+        with self.condition:
+            while not self.idle[profile] and self.created[profile] >= self.size:
+                self.condition.wait()
+            if self.idle[profile]:
+                return self.idle[profile].pop()
+            self.created[profile] += 1
+        try:
+            import yt_dlp
+            return yt_dlp.YoutubeDL(dict(self.PROFILES[profile]))
+        except Exception:
+            with self.condition:
+                self.created[profile] -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, profile, ydl):
+        with self.condition:
+            if self.closed:
+                ydl.close()
+                return
+            self.idle[profile].append(ydl)
+            self.condition.notify()
+
+    def warm(self, profile):
+        with self.session(profile):
+            pass
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            for sessions in self.idle.values():
+                for ydl in sessions:
+                    ydl.close()
+                sessions.clear()
 
 
 class CacheHandling:
-    def __init__(self, CACHE_FILE):
+    def __init__(self, CACHE_FILE, storage, extractors, max_entries=20000, ttl=5 * 3600, margin=300):
         self.file = CACHE_FILE
-        self.cache = self.load_cache()
+        self.storage = storage
+        self.extractors = extractors
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0, "stale": 0}
+        self.cache = OrderedDict()
+        self.loaded = False
+
+    def load(self):
+        with self.lock:
+            if not self.loaded:
+                self.cache = self.load_cache()
+                self.loaded = True
 
     def load_cache(self):
-        if os.path.exists(self.file):
-            with open(self.file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {}
+        self.migrate()
+        self.merge_duplicates()
+        cache = OrderedDict()
+        for url, data in self.storage.query("SELECT url, data FROM cache ORDER BY used"):
+            cache[url] = json.loads(data)
+        return cache
+
+    def migrate(self):
+        if self.storage.get_meta("cache_migrated") or not os.path.exists(self.file):
+            return
+        with open(self.file, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                logger.exception(f"Nie udalo sie odczytac {self.file}, pomijam migracje")
+                data = {}
+        now = time.time()
+        statements = [("INSERT OR IGNORE INTO cache (url, data, used) VALUES (?, ?, ?)", (url, json.dumps(self.compact(info)), now)) for url, info in data.items()]
+        statements.append(self.storage.set_meta_statement("cache_migrated", "1"))
+        self.storage.write_many(statements)
+        logger.info(f"Przeniesiono {len(data)} wpisow cache z {self.file} do bazy")
+
+    def merge_duplicates(self):
+        if self.storage.get_meta("cache_ids_migrated"):
+            return
+        newest = {}
+        aliases = []
+        for url, data, used in self.storage.query("SELECT url, data, used FROM cache ORDER BY used"):
+            key = track_key(url)
+            newest[key] = (data, used)
+            if key != url:
+                aliases.append((url, key))
+        statements = [("DELETE FROM cache WHERE url = ?", (url,)) for url, key in aliases]
+        statements += [("INSERT OR REPLACE INTO cache (url, data, used) VALUES (?, ?, ?)", (key, *newest[key])) for key in {key for url, key in aliases}]
+        statements.append(self.storage.set_meta_statement("cache_ids_migrated", "1"))
+        self.storage.write_many(statements)
+        logger.info(f"Przepisano {len(aliases)} wpisow cache na identyfikatory filmow")
+
+    def save_entry(self, url, entry, evicted):
+        statements = [("INSERT OR REPLACE INTO cache (url, data, used) VALUES (?, ?, ?)", (url, json.dumps(entry), time.time()))]
+        statements += [("DELETE FROM cache WHERE url = ?", (old_url,)) for old_url in evicted]
+        self.storage.write_many(statements)
+
+    def compact(self, info):
+        if "expire" in info and "formats" not in info:
+            return info
+        stream_url = info.get("url")
+        return {
+            "url": stream_url,
+            "expire": self.parse_expire(stream_url),
+            "duration": info.get("duration"),
+            "title": info.get("title"),
+            "format_id": info.get("format_id")
+        }
+
+    def parse_expire(self, stream_url):
+        match = re.search(r"[?&/]expire[=/](\d+)", stream_url or "")
+        if match:
+            return int(match.group(1))
+        return int(time.time()) + self.ttl
 
-    def save_cache(self):
-        with open(self.file, "w", encoding="utf-8") as f:
-            json.dump(self.cache, f, indent=4)
+    def fresh(self, entry):
+        return entry.get("url") and entry["expire"] - self.margin > time.time()
 
     def get_song_info(self, url):
-        if url in self.cache:
-            return self.cache[url]
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'extract_flat': True
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with tracer.span("get_song_info") as span:
+            span["result"] = "hit"
+            return self.lookup(url, span)
+
+    def lookup(self, url, span):
+        self.load()
+        key = track_key(url)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                if self.fresh(entry):
+                    self.stats["hit"] += 1
+                    self.cache.move_to_end(key)
+                    self.storage.write("UPDATE cache SET used = ? WHERE url = ?", (time.time(), key))
+                    return entry
+                self.stats["stale"] += 1
+                span["result"] = "stale"
+                logger.info(f"Link do audio wygasl: {url}")
+            else:
+                self.stats["miss"] += 1
+                span["result"] = "miss"
+        with self.extractors.session("stream") as ydl, tracer.span("extract_info"):
             info = ydl.extract_info(url, download=False)
-        self.cache[url] = info
-        self.save_cache()
+        entry = self.compact(info)
+        with self.lock:
+            self.cache[key] = entry
+            self.cache.move_to_end(key)
+            evicted = []
+            while len(self.cache) > self.max_entries:
+                evicted.append(self.cache.popitem(last=False)[0])
+            self.save_entry(key, entry, evicted)
+        return entry
+
+    def hit_ratio(self):
+        total = sum(self.stats.values())
+        if not total:
+            return None
+        return self.stats["hit"] / total
+
+
+class AudioStore:
+    def __init__(self, AUDIO_DIR, storage, quota_mb=1024, enabled=False):
+        self.dir = AUDIO_DIR
+        self.storage = storage
+        self.quota = quota_mb * 1024 * 1024
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.stats = {"hit": 0, "miss": 0, "bytes_saved": 0}
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-store")
+
+    def lookup(self, url):
+        key = video_id(url)
+        if not self.enabled or key is None:
+            return None
+        row = self.storage.query("SELECT path, size FROM audio WHERE video_id = ?", (key,))
+        if row and os.path.exists(row[0][0]):
+            path, size = row[0]
+            self.storage.write("UPDATE audio SET used = ? WHERE video_id = ?", (time.time(), key))
+            with self.lock:
+                self.stats["hit"] += 1
+                self.stats["bytes_saved"] += size
+            return path
+        if row:
+            self.storage.write("DELETE FROM audio WHERE video_id = ?", (key,))
+        with self.lock:
+            self.stats["miss"] += 1
+        return None
+
+    def offer(self, url, info):
+        key = video_id(url)
+        if not self.enabled or key is None:
+            return
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+        self.pool.submit(self.download, url, key, info.get("format_id"))
+
+    def download(self, url, key, format_id):
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            ydl_opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'noplaylist': True,
+                'format': f"{format_id}/bestaudio" if format_id else 'bestaudio',
+                'outtmpl': os.path.join(self.dir, f"{key}.%(ext)s")
+            }
+            import yt_dlp
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl, tracer.span("audio.download"):
+                info = ydl.extract_info(url, download=True)
+                path = ydl.prepare_filename(info)
+            size = os.path.getsize(path)
+            self.storage.write("INSERT OR REPLACE INTO audio (video_id, path, size, used) VALUES (?, ?, ?, ?)", (key, path, size, time.time()))
+            logger.info(f"Zapisano audio offline: {path} ({size} B)")
+            self.evict()
+        except Exception:
+            logger.exception(f"Nie udalo sie zapisac audio offline dla {key}")
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def evict(self):
+        total = self.storage.query("SELECT COALESCE(SUM(size), 0) FROM audio")[0][0]
+        while total > self.quota:
+            row = self.storage.query("SELECT video_id, path, size FROM audio ORDER BY used LIMIT 1")
+            if not row:
+                break
+            key, path, size = row[0]
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.storage.write("DELETE FROM audio WHERE video_id = ?", (key,))
+            logger.info(f"Usunieto audio offline: {path}")
+            total -= size
+
+    def hit_ratio(self):
+        total = self.stats["hit"] + self.stats["miss"]
+        if not total:
+            return None
+        return self.stats["hit"] / total
+
+    def saved_mb(self):
+        return self.stats["bytes_saved"] / (1024 * 1024)
+
+    def shutdown(self):
+        if self.stats["hit"]:
+            logger.info(f"Pamiec offline: {self.stats['hit']} trafien, zaoszczedzono {self.saved_mb():.1f} MB")
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class HealthScanner:
+    DEAD = re.compile(r"video unavailable|private video|this video has been removed|this video is no longer available|account associated with this video has been terminated|copyright claim", re.IGNORECASE)
+
+    def __init__(self, root, scheduler, library, storage, extractors, rate=1.0, workers=2, max_age=24 * 3600, period=3600, delay=30):
+        self.root = root
+        self.scheduler = scheduler
+        self.library = library
+        self.storage = storage
+        self.extractors = extractors
+        self.interval = 1 / rate
+        self.max_age = max_age
+        self.period = period
+        self.delay = delay
+        self.status = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.next_request = 0.0
+        self.pending = 0
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="health")
+
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    def start(self):
+        self.pool.submit(self.load)
+        self.scheduler.once("health", self.delay * 1000, self.scan, pausable=False)
+
+    def load(self):
+        for key, available, duration, checked in self.storage.query("SELECT video_id, available, duration, checked FROM health"):
+            self.status.setdefault(key, (available, duration, checked))
+        dead = sum(1 for available, duration, checked in self.status.values() if not available)
+        logger.info(f"Wczytano stan {len(self.status)} utworow, niedostepne: {dead}")
+        self.post(None, None)
+
+    def available(self, name):
+        if name not in self.library:
+            return True
+        entry = self.status.get(track_key(self.library.url_of(name)))
+        return entry is None or bool(entry[0])
+
+    def duration(self, name):
+        if name not in self.library:
+            return None
+        entry = self.status.get(track_key(self.library.url_of(name)))
+        return entry[1] if entry else None
+
+    def scan(self):
+        if self.stopping.is_set() or self.pending:
+            return
+        self.pool.submit(self.select, list(self.library.items()))
+
+    def select(self, tracks):
+        now = time.time()
+        due = [(name, url) for name, url in tracks if now - self.status.get(track_key(url), (1, None, 0))[2] > self.max_age]
+        if not due:
+            self.post_finish()
+            return
+        logger.info(f"Sprawdzanie dostepnosci {len(due)} utworow")
+        with self.lock:
+            self.pending = len(due)
+        for name, url in due:
+            self.pool.submit(self.check, name, url)
+
+    def throttle(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.interval
+        if wait > 0:
+            self.stopping.wait(wait)
+
+    def check(self, name, url):
+        try:
+            if self.stopping.is_set():
+                return
+            self.throttle()
+            if self.stopping.is_set():
+                return
+            self.update(name, url, *self.probe(name, url))
+        except Exception as error:
+            logger.warning(f"Nie udalo sie sprawdzic utworu '{name}': {error}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+                finished = self.pending == 0
+            if finished:
+                self.post_finish()
+
+    def probe(self, name, url):
+        with tracer.span("health.check"):
+            try:
+                with self.extractors.session("metadata") as ydl:
+                    info = ydl.extract_info(url, download=False, process=False)
+            except Exception as error:
+                if self.transient(error) or not self.DEAD.search(str(error)):
+                    raise
+                return False, None
+        return True, info.get("duration")
+
+    def transient(self, error):
+        from urllib.error import URLError
+        from yt_dlp.networking.exceptions import RequestError
+        seen = set()
+        while error is not None and id(error) not in seen:
+            seen.add(id(error))
+            if isinstance(error, (RequestError, URLError, OSError)):
+                return True
+            exc_info = getattr(error, "exc_info", None)
+            error = (exc_info[1] if exc_info else None) or error.__cause__ or error.__context__
+        return False
+
+    def update(self, name, url, available, duration):
+        key = track_key(url)
+        previous = self.status.get(key)
+        checked = time.time()
+        self.status[key] = (int(available), duration, checked)
+        self.storage.write("INSERT OR REPLACE INTO health (video_id, available, duration, checked) VALUES (?, ?, ?, ?)", (key, int(available), duration, checked))
+        if previous is None or bool(previous[0]) != available:
+            logger.info(f"Utwor '{name}' {'dostepny' if available else 'niedostepny'}")
+            self.post(name, available)
+
+    def post(self, name, available):
+        try:
+            self.root.after(0, lambda: self.notify(name, available))
+        except RuntimeError:
+            pass
+
+    def notify(self, name, available):
+        for callback in self.listeners:
+            callback(name, available)
+
+    def post_finish(self):
+        try:
+            self.root.after(0, self.finish)
+        except RuntimeError:
+            pass
+
+    def finish(self):
+        if self.stopping.is_set():
+            return
+        self.scheduler.once("health", self.period * 1000, self.scan, pausable=False)
+
+    def shutdown(self):
+        self.stopping.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamResolver:
+    def __init__(self, root, cache, audio_store=None, workers=2):
+        self.root = root
+        self.cache = cache
+        self.audio_store = audio_store
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resolver")
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.current = None
+        self.token = 0
+
+    def resolve(self, url, on_done, on_error):
+        self.cancel()
+        token = self.token
+        self.current = self.pool.submit(self.locate, url)
+        self.current.add_done_callback(lambda future: self.post(future, token, on_done, on_error))
+        return self.current
+
+    def locate(self, url):
+        if self.audio_store is not None:
+            path = self.audio_store.lookup(url)
+            if path:
+                logger.info(f"Odtwarzanie z pamieci offline: {path}")
+                return {"url": path, "local": True}
+        info = self.cache.get_song_info(url)
+        if self.audio_store is not None:
+            self.audio_store.offer(url, info)
         return info
 
+    def prefetch(self, url, on_done, on_error):
+        future = self.prefetch_pool.submit(self.locate, url)
+        future.add_done_callback(lambda future: self.post(future, None, on_done, on_error))
+        return future
+
+    def run(self, func, on_done, on_error, *args):
+        future = self.pool.submit(func, *args)
+        future.add_done_callback(lambda future: self.post(future, None, on_done, on_error))
+        return future
+
+    def post(self, future, token, on_done, on_error):
+        if future.cancelled():
+            return
+        try:
+            self.root.after(0, lambda: self.deliver(future, token, on_done, on_error))
+        except RuntimeError:
+            pass
+
+    def deliver(self, future, token, on_done, on_error):
+        if token is not None:
+            if token != self.token:
+                return
+            self.current = None
+        error = future.exception()
+        if error is not None:
+            on_error(error)
+        else:
+            on_done(future.result())
+
+    def cancel(self):
+        self.token += 1
+        if self.current is None:
+            return False
+        self.current.cancel()
+        self.current = None
+        return True
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.prefetch_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BulkImporter:
+    def __init__(self, root, library, extractors, workers=4):
+        self.root = root
+        self.library = library
+        self.extractors = extractors
+        self.workers = workers
+        self.cancelled = False
+
+    def start(self, source, on_progress, on_done, on_error):
+        threading.Thread(target=self.run, args=(source, on_progress, on_done, on_error), name="bulk-import", daemon=True).start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def post(self, func, *args):
+        if self.cancelled:
+            return
+        try:
+            self.root.after(0, lambda: func(*args))
+        except RuntimeError:
+            pass
+
+    def run(self, source, on_progress, on_done, on_error):
+        try:
+            entries = self.read_source(source)
+            tracks, urls, skipped = self.dedupe(entries)
+            total = len(urls)
+            self.post(on_progress, 0, total)
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-import") as pool:
+                futures = {pool.submit(self.fetch_title, url): url for url in urls}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    if self.cancelled:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        return
+                    try:
+                        tracks.append((future.result(), futures[future]))
+                    except Exception:
+                        logger.warning(f"Nie udalo sie pobrac tytulu: {futures[future]}", exc_info=True)
+                        skipped += 1
+                    self.post(on_progress, done, total)
+            self.post(on_done, tracks, skipped)
+        except Exception as error:
+            self.post(on_error, error)
+
+    def read_source(self, source):
+        if os.path.isfile(source):
+            entries = []
+            with open(source, newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    cells = [cell.strip() for cell in row if cell.strip()]
+                    url = next((cell for cell in cells if YOUTUBE_REGEX.match(cell)), None)
+                    if url:
+                        name = next((cell for cell in cells if cell != url), None)
+                        entries.append((name, url))
+            return entries
+        if "list=" in source:
+            with self.extractors.session("playlist") as ydl:
+                info = ydl.extract_info(source, download=False)
+            entries = []
+            for entry in info.get("entries") or []:
+                url = entry.get("url") or f"https://www.youtube.com/watch?v={entry.get('id')}"
+                entries.append((entry.get("title"), url))
+            return entries
+        return [(None, source)]
+
+    def dedupe(self, entries):
+        seen = set()
+        tracks = []
+        urls = []
+        skipped = 0
+        for name, url in entries:
+            key = track_key(url)
+            if key in seen or self.library.has_url(url):
+                skipped += 1
+                continue
+            seen.add(key)
+            if name:
+                tracks.append((name, url))
+            else:
+                urls.append(url)
+        return tracks, urls, skipped
+
+    def fetch_title(self, url):
+        with self.extractors.session("metadata") as ydl:
+            info = ydl.extract_info(url, download=False)
+        return info.get("title") or url
+
+
+class LookAhead:
+    def __init__(self, resolver, depth=2):
+        self.resolver = resolver
+        self.depth = depth
+        self.entries = []
+        self.futures = []
+        self.token = 0
+
+    def reset(self):
+        self.token += 1
+        self.entries = []
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+
+    def fill(self, tracks, on_ready, queued=0):
+        token = self.token
+        for i, (name, url) in enumerate(tracks):
+            entry = {"name": name, "url": url, "audio_url": None, "appended": False, "queued": i < queued}
+            self.entries.append(entry)
+            self.futures.append(self.resolver.prefetch(
+                url,
+                lambda info, entry=entry: self.resolved(token, entry, info, on_ready),
+                lambda error, entry=entry: self.failed(token, entry, error, on_ready)
+            ))
+
+    def resolved(self, token, entry, info, on_ready):
+        if token != self.token:
+            return
+        entry["audio_url"] = info.get('url', None)
+        if entry["audio_url"] is None:
+            self.entries.remove(entry)
+        self.flush(on_ready)
+
+    def failed(self, token, entry, error, on_ready):
+        if token != self.token:
+            return
+        logger.error(f"Nie udalo sie wczesniej pobrac '{entry['name']}'", exc_info=error)
+        self.entries.remove(entry)
+        self.flush(on_ready)
+
+    def flush(self, on_ready):
+        for entry in self.entries:
+            if entry["appended"]:
+                continue
+            if entry["audio_url"] is None:
+                break
+            on_ready(entry)
+            entry["appended"] = True
+
+    def ready(self):
+        return bool(self.entries) and self.entries[0]["appended"]
+
+    def pop(self):
+        return self.entries.pop(0)
+
+    def last_name(self):
+        if self.entries:
+            return self.entries[-1]["name"]
+        return None
+
+
+class TransitionMetrics:
+    def __init__(self, size=100):
+        self.gaps = deque(maxlen=size)
+        self.started = None
+
+    def begin(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def cancel(self):
+        self.started = None
+
+    def end(self):
+        if self.started is None:
+            return None
+        gap = (time.perf_counter() - self.started) * 1000
+        self.started = None
+        self.gaps.append(gap)
+        logger.info(f"Przerwa miedzy utworami: {gap:.0f} ms")
+        return gap
+
+    def average(self):
+        if not self.gaps:
+            return None
+        return sum(self.gaps) / len(self.gaps)
+
+
+class LazyPlayer:
+    METHODS = {"play", "stop", "seek", "command", "playlist_append", "playlist_clear", "playlist_remove", "playlist_next", "terminate"}
+
+    def __init__(self, **options):
+        self.__dict__["options"] = options
+        self.__dict__["player"] = None
+        self.__dict__["pending"] = {}
+        self.__dict__["calls"] = []
+
+    def create(self):
+        import mpv
+        return mpv.MPV(**self.options)
+
+    def attach(self, player):
+        for name, value in self.pending.items():
+            setattr(player, name, value)
+        for name, args, kwargs in self.calls:
+            getattr(player, name)(*args, **kwargs)
+        self.pending.clear()
+        self.calls.clear()
+        self.__dict__["player"] = player
+
+    def ready(self):
+        return self.player is not None
+
+    def record(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def __getattr__(self, name):
+        if self.player is not None:
+            return getattr(self.player, name)
+        if name in self.METHODS:
+            return self.record(name)
+        return self.pending.get(name)
+
+    def __setattr__(self, name, value):
+        if self.player is not None:
+            setattr(self.player, name, value)
+        else:
+            self.pending[name] = value
+
+
+class StartupProfiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.phases = [("import", (IMPORT_END - IMPORT_START) * 1000)]
+        self.last = time.perf_counter()
+        self.waiting = set()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.record(phase, self.last, now)
+        self.last = now
+
+    def record(self, phase, started, ended=None):
+        ended = time.perf_counter() if ended is None else ended
+        with self.lock:
+            self.phases.append((phase, (ended - started) * 1000))
+
+    def wait_for(self, *phases):
+        self.waiting.update(phases)
+
+    def done(self, phase):
+        self.waiting.discard(phase)
+        if not self.waiting:
+            self.report()
+
+    def report(self):
+        total = (time.perf_counter() - IMPORT_START) * 1000
+        lines = [f"{phase:<16}{ms:>9.1f} ms" for phase, ms in self.phases]
+        lines.append(f"{'ready':<16}{total:>9.1f} ms")
+        logger.info("Czas uruchamiania: " + ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in self.phases))
+        if self.enabled:
+            print("\n".join(lines), flush=True)
+
+
+class ProgressMonitor:
+    def __init__(self, root, player, on_progress, on_playlist_pos, on_eof, rate=4, on_transition=None):
+        import mpv
+        self.root = root
+        self.player = player
+        self.eof = mpv.MpvEventEndFile.EOF
+        self.on_progress = on_progress
+        self.on_playlist_pos = on_playlist_pos
+        self.on_eof = on_eof
+        self.on_transition = on_transition
+        self.interval = 1 / rate
+        self.values = {"time-pos": None, "duration": None, "playlist-pos": None}
+        self.lock = threading.Lock()
+        self.pending = False
+        self.last = 0
+        for name in self.values:
+            self.player.observe_property(name, self.observe)
+        self.player.event_callback('end-file')(self.end_file)
+
+    def observe(self, name, value):
+        if name == "playlist-pos" and self.on_transition is not None and (value or 0) > (self.values[name] or 0):
+            self.on_transition()
+        self.values[name] = value
+        with self.lock:
+            if self.pending:
+                return
+            self.pending = True
+        delay = max(0, self.interval - (time.perf_counter() - self.last))
+        self.post(int(delay * 1000), self.refresh)
+
+    def end_file(self, event):
+        if event.data.reason == self.eof:
+            if self.on_transition is not None:
+                self.on_transition()
+            self.post(0, self.on_eof)
+
+    def post(self, delay, func):
+        try:
+            self.root.after(delay, func)
+        except RuntimeError:
+            pass
+
+    def refresh(self):
+        with self.lock:
+            self.pending = False
+        self.last = time.perf_counter()
+        self.on_playlist_pos(self.values["playlist-pos"])
+        self.on_progress(self.values["time-pos"], self.values["duration"])
+
+
+class ShuffleOrder:
+    def __init__(self, storage, library, history_size=200):
+        self.storage = storage
+        self.library = library
+        self.history_size = history_size
+        self.order = []
+        self.index = {}
+        self.position = -1
+        self.history = []
+        self.cursor = -1
+        self.loaded = False
+        self.playable = lambda name: True
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        self.order = [name for (name,) in self.storage.query("SELECT name FROM shuffle ORDER BY pos")]
+        self.index = {name: i for i, name in enumerate(self.order)}
+        self.position = min(int(self.storage.get_meta("shuffle_position") or -1), len(self.order) - 1)
+        state = self.storage.get_meta("shuffle_history")
+        if state:
+            self.history, self.cursor = json.loads(state)
+        if not self.order or len(self.index) != len(self.order):
+            self.reshuffle()
+            return
+        stale = [name for name in self.order if name not in self.library]
+        for name in stale:
+            self.remove(name)
+        self.add(*[name for name in self.library.names if name not in self.index])
+        logger.info(f"Wczytano kolejnosc losowania ({len(self.order)} utworow)")
+
+    def swap(self, i, j):
+        self.order[i], self.order[j] = self.order[j], self.order[i]
+        self.index[self.order[i]] = i
+        self.index[self.order[j]] = j
+
+    def commit(self, changed=(), deleted=None):
+        statements = [("INSERT OR REPLACE INTO shuffle (pos, name) VALUES (?, ?)", (pos, self.order[pos])) for pos in changed if pos < len(self.order)]
+        if deleted is not None:
+            statements.append(("DELETE FROM shuffle WHERE pos = ?", (deleted,)))
+        statements.append(self.storage.set_meta_statement("shuffle_position", str(self.position)))
+        statements.append(self.storage.set_meta_statement("shuffle_history", json.dumps([self.history, self.cursor])))
+        self.storage.write_many(statements)
+
+    def reshuffle(self, avoid=None):
+        names = list(self.library.names)
+        random.shuffle(names)
+        if avoid is not None and len(names) > 1 and names[0] == avoid:
+            j = random.randrange(1, len(names))
+            names[0], names[j] = names[j], names[0]
+        self.order = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.position = -1
+        self.storage.write_many([("DELETE FROM shuffle", ())] + [("INSERT INTO shuffle (pos, name) VALUES (?, ?)", (i, name)) for i, name in enumerate(names)])
+        self.commit()
+        logger.info(f"Wylosowano nowa kolejnosc ({len(names)} utworow)")
+
+    def add(self, *names):
+        if not self.loaded or not names:
+            return
+        changed = set()
+        for name in names:
+            if name in self.index:
+                continue
+            last = len(self.order)
+            self.order.append(name)
+            self.index[name] = last
+            j = random.randint(self.position + 1, last)
+            self.swap(j, last)
+            changed.update((j, last))
+        self.commit(changed)
+
+    def remove(self, name):
+        if name in self.history:
+            before = self.history[:self.cursor + 1].count(name)
+            self.history = [item for item in self.history if item != name]
+            self.cursor = min(max(self.cursor - before, 0), len(self.history) - 1)
+        if not self.loaded or name not in self.index:
+            return
+        i = self.index[name]
+        changed = set()
+        if i <= self.position:
+            self.swap(i, self.position)
+            changed.add(i)
+            i = self.position
+            self.position -= 1
+        last = len(self.order) - 1
+        self.swap(i, last)
+        changed.add(i)
+        self.order.pop()
+        del self.index[name]
+        changed.discard(last)
+        self.commit(changed, deleted=last)
+
+    def rename(self, name, new_name):
+        self.history = [new_name if item == name else item for item in self.history]
+        if not self.loaded or name not in self.index:
+            return
+        i = self.index.pop(name)
+        self.order[i] = new_name
+        self.index[new_name] = i
+        self.commit({i})
+
+    def visit(self, name):
+        self.load()
+        if self.history and self.history[self.cursor] == name:
+            return
+        if self.cursor + 1 < len(self.history) and self.history[self.cursor + 1] == name:
+            self.cursor += 1
+            self.commit()
+            return
+        del self.history[self.cursor + 1:]
+        self.history.append(name)
+        del self.history[:-self.history_size]
+        self.cursor = len(self.history) - 1
+        changed = set()
+        i = self.index.get(name)
+        if i is not None and i > self.position:
+            self.position += 1
+            self.swap(i, self.position)
+            changed.update((i, self.position))
+        self.commit(changed)
+
+    def remaining(self, count):
+        names = []
+        for i in range(self.position + 1, len(self.order)):
+            if len(names) >= count:
+                break
+            if self.playable(self.order[i]):
+                names.append(self.order[i])
+        return names
+
+    def upcoming(self, count):
+        self.load()
+        names = [name for name in self.history[self.cursor + 1:] if self.playable(name)][:count]
+        if len(names) < count:
+            rest = self.remaining(count - len(names))
+            if not rest:
+                self.reshuffle(avoid=self.history[self.cursor] if self.history else None)
+                rest = self.remaining(count - len(names))
+            names += rest
+        return names
+
+    def next_name(self):
+        self.load()
+        while self.cursor + 1 < len(self.history):
+            self.cursor += 1
+            if self.playable(self.history[self.cursor]):
+                self.commit()
+                return self.history[self.cursor]
+        names = self.upcoming(1)
+        return names[0] if names else None
+
+    def back(self):
+        self.load()
+        cursor = self.cursor - 1
+        while cursor >= 0 and not self.playable(self.history[cursor]):
+            cursor -= 1
+        if cursor < 0:
+            return None
+        self.cursor = cursor
+        self.commit()
+        return self.history[cursor]
+
+
+class EventLoop:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.tasks = []
+        self.cancelled = set()
+        self.count = 0
+        self.running = True
+
+    def after(self, delay, func):
+        with self.condition:
+            self.count += 1
+            heapq.heappush(self.tasks, (time.monotonic() + delay / 1000, self.count, func))
+            self.condition.notify()
+        return self.count
+
+    def after_cancel(self, handle):
+        with self.condition:
+            self.cancelled.add(handle)
+
+    def next_task(self):
+        with self.condition:
+            while self.running:
+                if self.tasks and self.tasks[0][0] <= time.monotonic():
+                    due, handle, func = heapq.heappop(self.tasks)
+                    if handle in self.cancelled:
+                        self.cancelled.discard(handle)
+                        continue
+                    return func
+                timeout = self.tasks[0][0] - time.monotonic() if self.tasks else None
+                self.condition.wait(timeout)
+            return None
+
+    def mainloop(self):
+        while True:
+            func = self.next_task()
+            if func is None:
+                return
+            try:
+                func()
+            except Exception:
+                logger.error("Blad w petli zdarzen", exc_info=True)
+
+    def quit(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+
+class PlayerEngine:
+    MODES = ["repeat", "next", "stop"]
+    MODE_LABELS = {"repeat": "REPEAT MODE", "next": "NEXT MODE", "stop": "STOP MODE"}
+    EVENTS = ["resolving", "track", "state", "progress", "error", "cancelled", "mode", "shuffle", "mute", "volume", "queue", "rename"]
+
+    def __init__(self, root, library, settings, resolver, storage, health=None):
+        self.root = root
+        self.library = library
+        self.settings = settings
+        self.resolver = resolver
+        self.health = health
+        self.shuffle = ShuffleOrder(storage, library)
+        self.shuffle.playable = self.playable
+        self.player = LazyPlayer(ytdl=True, video=False, cache=True, gapless_audio="yes", prefetch_playlist="yes", demuxer_readahead_secs=20)
+        self.lookahead = LookAhead(self.resolver)
+        self.transitions = TransitionMetrics()
+        self.progress = None
+        self.listeners = {}
+        self.queue = deque()
+        self.current_name = None
+        self.state = "stopped"
+        self.shuffle_mode = self.settings.show()["shuffle"] == "shuffle_on"
+        self.play_mode = {"repeat_mode": "repeat", "next_mode": "next"}.get(self.settings.show()["play_mode"], "stop")
+        self.player.mute = self.settings.show()["mute"] == "mute_on"
+        self.player.volume = self.settings.show()["volume"]
+
+    def subscribe(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def emit(self, event, *args):
+        for callback in self.listeners.get(event, []):
+            callback(*args)
+
+    def attach(self, player, rate=4):
+        self.player.attach(player)
+        self.progress = ProgressMonitor(self.root, self.player, self.on_progress, self.on_playlist_pos, self.on_track_end, rate=rate, on_transition=self.transitions.begin)
+        self.player.observe_property("time-pos", self.observe_first_audio)
+
+    def observe_first_audio(self, name, value):
+        if value:
+            self.transitions.end()
+        if value and tracer.waiting("first_audio"):
+            tracer.end("first_audio")
+            tracer.end("play_to_audio")
+
+    def set_state(self, state):
+        self.state = state
+        self.emit("state", state)
+
+    def play(self, name):
+        self.stop()
+        if name not in self.library:
+            logger.info("Nie wybrano zadnego utworu")
+            self.emit("error", "no_track_sel")
+            return None
+        url = self.library.url_of(name)
+        logger.debug(f"Link do video: {url}")
+        logger.info(f"Odtwarzanie utworu: {name}")
+        self.emit("resolving", name)
+        tracer.begin("play_to_audio", track=name)
+        tracer.begin("fetch_audio_url", track=name)
+        return self.resolver.resolve(url, lambda info: self.on_audio_url(name, info), self.on_audio_url_fail)
+
+    def on_audio_url(self, name, info):
+        audio_url = info.get('url', None)
+        if not audio_url:
+            self.on_audio_url_fail(None)
+            return
+        tracer.end("fetch_audio_url", local=info.get("local", False))
+        self.current_name = name
+        if self.shuffle_mode:
+            self.shuffle.visit(name)
+        if self.queue and self.queue[0] == name:
+            self.queue.popleft()
+            self.emit("queue", list(self.queue))
+        self.emit("track", name)
+        logger.debug(f"Link do audio: {short_url(audio_url)}")
+        with tracer.span("player.play"):
+            self.player.play(audio_url)
+        tracer.begin("first_audio")
+        self.prefetch_next()
+        self.player.pause = False
+        self.set_state("playing")
+
+    def on_audio_url_fail(self, error):
+        tracer.end("fetch_audio_url", error=True)
+        tracer.cancel("play_to_audio")
+        logger.error("Nie udalo sie pobrac audio", exc_info=error)
+        self.emit("error", "audio_download_fail")
+
+    def toggle_play_pause(self, name=None):
+        if self.player.pause:
+            self.resume()
+        elif self.player.playback_time:
+            self.pause()
+        else:
+            self.play(name)
+
+    def pause(self):
+        logger.info("Wstrzymano odtwarzanie")
+        self.player.pause = True
+        self.set_state("paused")
+
+    def resume(self):
+        logger.info("Wznowiono odtwarzanie")
+        self.player.pause = False
+        self.set_state("playing")
+
+    def stop(self):
+        if self.resolver.cancel():
+            logger.info("Anulowano pobieranie linku do audio")
+            self.emit("cancelled")
+        tracer.cancel("fetch_audio_url", "play_to_audio", "first_audio")
+        self.release_lookahead()
+        playing = self.current_name is not None or self.player.playback_time
+        self.current_name = None
+        if playing:
+            logger.info("Zatrzymano odtwarzanie")
+            self.player.stop()
+            self.player.pause = False
+            self.set_state("stopped")
+
+    def seek(self, position):
+        duration = self.player.duration
+        if duration and position < duration:
+            self.player.seek(position, reference="absolute")
+
+    def playable(self, name):
+        return self.health is None or self.health.available(name)
+
+    def following(self, index, step=1):
+        size = len(self.library)
+        for offset in range(1, size + 1):
+            candidate = (index + step * offset) % size
+            if self.playable(self.library.name_at(candidate)):
+                return candidate
+        return (index + step) % size
+
+    def play_next(self, name=None):
+        logger.info("Nastepny utwor")
+        name = self.current_name if name is None else name
+        if self.queue and self.queue[0] not in self.library:
+            self.queue = deque(queued for queued in self.queue if queued in self.library)
+            self.emit("queue", list(self.queue))
+        upcoming = self.lookahead.entries[0] if self.lookahead.entries else None
+        if upcoming and (upcoming["queued"] or self.play_mode == "next") and upcoming["name"] in self.library and self.current_name == name:
+            self.play(upcoming["name"])
+        elif self.queue:
+            self.play(self.queue[0])
+        elif self.shuffle_mode and len(self.library):
+            self.play(self.shuffle.next_name())
+        elif name in self.library:
+            self.play(self.library.name_at(self.following(self.library.index_of(name))))
+
+    def play_previous(self, name=None):
+        logger.info("Poprzedni utwor")
+        name = self.current_name if name is None else name
+        previous = self.shuffle.back() if self.shuffle_mode else None
+        if previous in self.library:
+            self.play(previous)
+            return
+        if name not in self.library:
+            return
+        self.play(self.library.name_at(self.following(self.library.index_of(name), -1)))
+
+    def on_track_end(self):
+        if self.lookahead.ready():
+            return
+        queued = self.queue or any(entry["queued"] for entry in self.lookahead.entries)
+        if self.play_mode == "repeat" and not queued:
+            self.play(self.current_name)
+        elif self.play_mode == "next" or queued:
+            self.play_next()
+        elif self.play_mode == "stop":
+            self.transitions.cancel()
+            self.stop()
+
+    def toggle_play_mode(self):
+        self.play_mode = self.MODES[(self.MODES.index(self.play_mode) + 1) % len(self.MODES)]
+        logger.info(self.MODE_LABELS[self.play_mode])
+        self.settings.overwrite_data(key="play_mode", new_value=f'{self.play_mode}_mode')
+        self.prefetch_next()
+        self.emit("mode", self.play_mode)
+
+    def toggle_shuffle(self):
+        self.shuffle_mode = not self.shuffle_mode
+        logger.info("SHUFFLE ON" if self.shuffle_mode else "SHUFFLE OFF")
+        self.settings.overwrite_data(key="shuffle", new_value="shuffle_on" if self.shuffle_mode else "shuffle_off")
+        self.prefetch_next()
+        self.emit("shuffle", self.shuffle_mode)
+
+    def set_volume(self, volume):
+        self.player.volume = volume
+        self.settings.overwrite_data(key="volume", new_value=volume)
+        if self.player.mute and volume > 0:
+            self.set_mute(False)
+        self.emit("volume", volume)
+
+    def enqueue(self, name):
+        if name not in self.library:
+            logger.info(f"Nie znaleziono utworu '{name}'")
+            self.emit("error", "no_track_sel")
+            return
+        logger.info(f"Dodano do kolejki: {name}")
+        self.queue.append(name)
+        self.emit("queue", list(self.queue))
+        self.prefetch_next()
+
+    def remove(self, name):
+        self.shuffle.remove(name)
+        stale = any(entry["name"] == name for entry in self.lookahead.entries)
+        if stale:
+            self.release_lookahead()
+        if name in self.queue:
+            self.queue = deque(queued for queued in self.queue if queued != name)
+            self.emit("queue", list(self.queue))
+        if stale:
+            self.prefetch_next()
+
+    def rename(self, name, new_name):
+        self.shuffle.rename(name, new_name)
+        if self.current_name == name:
+            self.current_name = new_name
+        for entry in self.lookahead.entries:
+            if entry["name"] == name:
+                entry["name"] = new_name
+        if name in self.queue:
+            self.queue = deque(new_name if queued == name else queued for queued in self.queue)
+            self.emit("queue", list(self.queue))
+        self.emit("rename", name, new_name)
+
+    def status(self):
+        values = self.progress.values if self.progress is not None else {}
+        return {
+            "state": self.state,
+            "track": self.current_name,
+            "play_mode": self.play_mode,
+            "shuffle": self.shuffle_mode,
+            "volume": self.player.volume,
+            "mute": bool(self.player.mute),
+            "position": values.get("time-pos"),
+            "duration": values.get("duration"),
+            "queue": list(self.queue),
+            "settings_writes": self.settings.writes,
+            "offline_bytes_saved": self.resolver.audio_store.stats["bytes_saved"] if self.resolver.audio_store is not None else 0
+        }
+
+    def set_mute(self, muted):
+        self.player.mute = muted
+        self.settings.overwrite_data(key="mute", new_value="mute_on" if muted else "mute_off")
+        logger.info("MUTE ON" if muted else "MUTE OFF")
+        self.emit("mute", muted)
+
+    def on_progress(self, time_pos, duration):
+        if time_pos is None or not duration:
+            return
+        self.emit("progress", time_pos, duration)
+
+    def on_playlist_pos(self, pos):
+        if (pos or 0) > 0 and self.lookahead.ready():
+            self.on_playlist_advance()
+
+    def upcoming_tracks(self, after_name, count):
+        if self.play_mode == "stop" or after_name not in self.library or count <= 0:
+            return []
+        if self.play_mode == "repeat":
+            return [(after_name, self.library.url_of(after_name))] * count
+        if self.shuffle_mode:
+            skip = sum(1 for entry in self.lookahead.entries if not entry["queued"])
+            return [(name, self.library.url_of(name)) for name in self.shuffle.upcoming(skip + count)[skip:]]
+        tracks = []
+        index = self.library.index_of(after_name)
+        for i in range(count):
+            index = self.following(index)
+            name = self.library.name_at(index)
+            tracks.append((name, self.library.url_of(name)))
+        return tracks
+
+    def release_lookahead(self):
+        for entry in reversed(self.lookahead.entries):
+            if entry["queued"]:
+                self.queue.appendleft(entry["name"])
+        self.lookahead.reset()
+
+    def prefetch_next(self):
+        self.release_lookahead()
+        if self.current_name is None:
+            return
+        self.player.playlist_clear()
+        self.top_up_lookahead()
+
+    def top_up_lookahead(self):
+        after_name = self.lookahead.last_name() or self.current_name
+        missing = self.lookahead.depth - len(self.lookahead.entries)
+        queued = []
+        while self.queue and len(queued) < missing:
+            name = self.queue.popleft()
+            if name in self.library:
+                queued.append(name)
+        if queued:
+            after_name = queued[-1]
+        tracks = [(name, self.library.url_of(name)) for name in queued] + self.upcoming_tracks(after_name, missing - len(queued))
+        self.lookahead.fill(tracks, self.append_to_player, queued=len(queued))
+
+    def append_to_player(self, entry):
+        logger.info(f"Dodano do kolejki mpv: {entry['name']}")
+        self.player.playlist_append(entry["audio_url"])
+
+    def on_playlist_advance(self):
+        self.player.playlist_remove(0)
+        entry = self.lookahead.pop()
+        logger.info(f"Odtwarzanie utworu: {entry['name']}")
+        self.current_name = entry["name"]
+        if self.shuffle_mode:
+            self.shuffle.visit(entry["name"])
+        self.emit("track", entry["name"])
+        self.top_up_lookahead()
+
+
+class ControlServer:
+    QUERIES = {"status", "trace"}
+
+    def __init__(self, root, engine, port=None, path=None, queue_size=256):
+        self.root = root
+        self.engine = engine
+        self.port = port
+        self.path = path
+        self.queue_size = queue_size
+        self.clients = set()
+        self.writers = set()
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.commands = {
+            "play": lambda name=None: engine.play(name),
+            "toggle": lambda name=None: engine.toggle_play_pause(name),
+            "pause": engine.pause,
+            "resume": engine.resume,
+            "stop": engine.stop,
+            "next": lambda name=None: engine.play_next(name),
+            "previous": lambda name=None: engine.play_previous(name),
+            "seek": lambda position: engine.seek(float(position)),
+            "volume": lambda value: engine.set_volume(max(0, min(100, int(value)))),
+            "mute": lambda value=True: engine.set_mute(bool(value)),
+            "enqueue": lambda name: engine.enqueue(name),
+            "mode": engine.toggle_play_mode,
+            "shuffle": engine.toggle_shuffle,
+            "status": engine.status,
+            "trace": tracer.stats
+        }
+        for event in PlayerEngine.EVENTS:
+            engine.subscribe(event, lambda *args, event=event: self.publish(event, args))
+
+    def address(self):
+        return self.path or f"127.0.0.1:{self.port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="control", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.listen())
+        except OSError as error:
+            logger.error(f"Nie udalo sie uruchomic sterowania pod {self.address()}", exc_info=error)
+            self.loop.close()
+            return
+        logger.info(f"Sterowanie dostepne pod {self.address()}")
+        self.loop.run_forever()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+    async def listen(self):
+        if self.path:
+            self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle, "127.0.0.1", self.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        queue = asyncio.Queue(self.queue_size)
+        self.clients.add(queue)
+        self.writers.add(writer)
+        sender = asyncio.create_task(self.send(writer, queue))
+        try:
+            while line := await reader.readline():
+                self.offer(queue, await self.dispatch(line))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.clients.discard(queue)
+            self.writers.discard(writer)
+            try:
+                await asyncio.wait_for(queue.join(), 1)
+            except asyncio.TimeoutError:
+                pass
+            sender.cancel()
+            writer.close()
+
+    async def send(self, writer, queue):
+        while True:
+            message = await queue.get()
+            try:
+                writer.write((json.dumps(message) + "\n").encode("utf-8"))
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                queue.task_done()
+
+    async def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            request_id = request.pop("id", None)
+            cmd = request.pop("cmd")
+            func = self.commands[cmd]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {"ok": False, "error": "bad request"}
+        future = Future()
+        self.root.after(0, lambda: self.call(future, cmd, func, request))
+        try:
+            result = await asyncio.wrap_future(future)
+        except Exception as error:
+            return {"id": request_id, "ok": False, "error": str(error)}
+        return {"id": request_id, "ok": True, "result": result}
+
+    def call(self, future, cmd, func, params):
+        try:
+            result = func(**params)
+        except TypeError:
+            future.set_exception(ValueError(f"bad arguments for '{cmd}'"))
+            return
+        except Exception as error:
+            future.set_exception(error)
+            return
+        future.set_result(result if cmd in self.QUERIES else None)
+
+    def offer(self, queue, message):
+        if queue.full():
+            queue.get_nowait()
+            queue.task_done()
+        queue.put_nowait(message)
+
+    def broadcast(self, message):
+        for queue in self.clients:
+            self.offer(queue, message)
+
+    def publish(self, event, args):
+        if not self.clients or self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.broadcast, {"event": event, "args": list(args)})
+        except RuntimeError:
+            pass
+
+    async def disconnect(self):
+        self.server.close()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.clients)), 1)
+        except asyncio.TimeoutError:
+            pass
+        for writer in list(self.writers):
+            writer.close()
+
+    def close(self):
+        if self.loop is None or self.server is None or self.loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.disconnect(), self.loop).result(2)
+        except Exception:
+            logger.warning("Nie udalo sie rozlaczyc klientow sterowania", exc_info=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1)
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PlayerDaemon:
+    def __init__(self, track=None, control_port=None, control_socket=None):
+        logger.info("Uruchomiono odtwarzacz bez okna")
+        self.track = track
+        self.loop = EventLoop()
+        self.storage = Storage(DB_FILE)
+        self.data = FileHandling(URL_FILE, self.storage)
+        self.library = self.data.model
+        self.settings = SettingsConfig(SETTINGS_FILE)
+        self.extractors = ExtractorPool()
+        self.cache_data = CacheHandling(CACHE_FILE, self.storage, self.extractors)
+        self.audio_store = AudioStore(AUDIO_DIR, self.storage, quota_mb=self.settings.show().get("offline_quota_mb", 1024), enabled=self.settings.show().get("offline_cache", False))
+        self.resolver = StreamResolver(self.loop, self.cache_data, self.audio_store)
+        self.scheduler = UiScheduler(self.loop)
+        self.health = HealthScanner(self.loop, self.scheduler, self.library, self.storage, self.extractors) if self.settings.show().get("health_scan", True) else None
+        self.engine = PlayerEngine(self.loop, self.library, self.settings, self.resolver, self.storage, self.health)
+        self.control = None
+        if control_port is not None or control_socket:
+            self.control = ControlServer(self.loop, self.engine, port=control_port, path=control_socket)
+
+    def first_track(self):
+        if self.track is not None or not len(self.library):
+            return self.track
+        if self.engine.shuffle_mode:
+            return self.library.name_at(random.randrange(len(self.library)))
+        return self.library.name_at(0)
+
+    def run(self):
+        self.engine.attach(self.engine.player.create(), rate=1)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        if self.control is not None:
+            self.control.start()
+        if self.health is not None:
+            self.health.start()
+        self.loop.after(0, lambda: self.engine.play(self.first_track()))
+        self.loop.mainloop()
+        self.shutdown()
+
+    def stop(self, *args):
+        self.loop.quit()
+
+    def shutdown(self):
+        self.engine.stop()
+        if self.control is not None:
+            self.control.close()
+        self.engine.player.terminate()
+        if self.health is not None:
+            self.health.shutdown()
+        self.resolver.shutdown()
+        self.audio_store.shutdown()
+        self.extractors.close()
+        self.settings.flush()
+        self.storage.close()
+
 
 class SettingsConfig:
-    def __init__(self, SETTINGS_FILE):
+    def __init__(self, SETTINGS_FILE, delay=0.5):
         self.file = SETTINGS_FILE
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.dirty = False
+        self.writes = 0
         self.data = self.open_file()
+        atexit.register(self.flush)
         
     def open_file(self):
         with open(self.file, "r", encoding="utf-8") as f:
             return json.load(f)
 
     def overwrite_data(self, key, new_value):
-        self.data[key] = new_value
-        with open(self.file, "w", encoding="utf-8") as f:
-            json.dump(self.data, f)
+        with self.lock:
+            if self.data.get(key) == new_value:
+                return
+            self.data[key] = new_value
+            self.dirty = True
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+                data = dict(self.data)
+                self.dirty = False
+            tmp_file = self.file + ".tmp"
+            try:
+                with tracer.span("settings.write"):
+                    with open(tmp_file, "w", encoding="utf-8") as f:
+                        json.dump(data, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_file, self.file)
+            except OSError:
+                with self.lock:
+                    self.dirty = True
+                raise
+            self.writes += 1
+        logger.debug(f"Zapisano ustawienia (zapis nr {self.writes})")
 
     def show(self):
         return self.data
 
 
+class UiScheduler:
+    def __init__(self, root):
+        self.root = root
+        self.tasks = {}
+        self.handle = None
+        self.paused = False
+        if hasattr(self.root, "bind"):
+            self.root.bind('<Unmap>', self.on_unmap, add="+")
+            self.root.bind('<Map>', self.on_map, add="+")
+
+    def now(self):
+        return time.perf_counter() * 1000
+
+    def every(self, name, interval, func, delay=None, pausable=True):
+        self.tasks[name] = {
+            "func": func,
+            "interval": interval,
+            "due": self.now() + (interval if delay is None else delay),
+            "repeat": True,
+            "pausable": pausable
+        }
+        self.reschedule()
+
+    def once(self, name, delay, func, pausable=True):
+        self.tasks[name] = {"func": func, "interval": delay, "due": self.now() + delay, "repeat": False, "pausable": pausable}
+        self.reschedule()
+
+    def cancel(self, name):
+        if self.tasks.pop(name, None) is None:
+            return False
+        self.reschedule()
+        return True
+
+    def running(self, name):
+        return name in self.tasks
+
+    def active(self):
+        return len(self.tasks)
+
+    def runnable(self, task):
+        return not (self.paused and task["pausable"])
+
+    def reschedule(self):
+        if self.handle is not None:
+            self.root.after_cancel(self.handle)
+            self.handle = None
+        due = [task["due"] for task in self.tasks.values() if self.runnable(task)]
+        if due:
+            self.handle = self.root.after(max(0, int(min(due) - self.now())), self.run)
+
+    def run(self):
+        self.handle = None
+        now = self.now()
+        for name, task in list(self.tasks.items()):
+            if self.tasks.get(name) is not task or not self.runnable(task) or task["due"] > now + 1:
+                continue
+            if task["repeat"]:
+                task["due"] = now + task["interval"]
+            else:
+                del self.tasks[name]
+            try:
+                next_delay = task["func"]()
+            except Exception:
+                logger.error(f"Blad w zadaniu '{name}'", exc_info=True)
+                continue
+            if task["repeat"] and next_delay is not None and self.tasks.get(name) is task:
+                task["due"] = now + next_delay
+        self.reschedule()
+
+    def on_unmap(self, event):
+        if event.widget is self.root and not self.paused:
+            logger.info("Okno zminimalizowane, wstrzymano animacje")
+            self.paused = True
+            self.reschedule()
+
+    def on_map(self, event):
+        if event.widget is self.root and self.paused:
+            self.paused = False
+            self.reschedule()
+
+
+class FrameCache:
+    def __init__(self, root, path, scale=10, on_ready=None):
+        self.root = root
+        self.path = path
+        self.on_ready = on_ready
+        self.scaled = []
+        self.photos = []
+        self.ready = False
+        with open(self.path, "rb") as f:
+            width, height = struct.unpack("<HH", f.read(10)[6:10])
+        self.size = (max(1, width // scale), max(1, height // scale))
+        self.static = tk.PhotoImage(width=self.size[0], height=self.size[1])
+        threading.Thread(target=self.decode, name="gif-decoder", daemon=True).start()
+
+    def __len__(self):
+        return len(self.scaled)
+
+    def decode(self):
+        try:
+            from PIL import Image, ImageSequence
+            with Image.open(self.path) as image:
+                for frame in ImageSequence.Iterator(image):
+                    self.scaled.append(frame.convert("RGBA").resize(self.size, Image.LANCZOS))
+        except Exception:
+            logger.exception("Nie udalo sie wczytac animacji gif")
+        try:
+            self.root.after(0, self.finish)
+        except RuntimeError:
+            pass
+
+    def finish(self):
+        self.ready = True
+        if self.scaled:
+            self.static = self.get(len(self.scaled) - 1)
+        if self.on_ready:
+            self.on_ready()
+
+    def get(self, index):
+        while len(self.photos) <= index:
+            self.photos.append(None)
+        if self.photos[index] is None:
+            from PIL import ImageTk
+            self.photos[index] = ImageTk.PhotoImage(self.scaled[index])
+            self.scaled[index] = None
+        return self.photos[index]
+
+
+class PlaylistView:
+    def __init__(self, master, model, height=5, **kwargs):
+        self.listbox = tk.Listbox(master, height=height, **kwargs)
+        self.model = model
+        self.height = height
+        self.top = 0
+        self.selected = None
+        self.active = 0
+        self.flagged = lambda name: False
+        self.flag_color = "gray"
+        self.listbox.bind('<Button-1>', self.click)
+        self.listbox.bind('<B1-Motion>', self.click)
+        self.listbox.bind('<Up>', lambda event: self.move(-1))
+        self.listbox.bind('<Down>', lambda event: self.move(1))
+        self.listbox.bind('<Prior>', lambda event: self.move(-self.height))
+        self.listbox.bind('<Next>', lambda event: self.move(self.height))
+        self.listbox.bind('<Control-Home>', lambda event: self.select(0))
+        self.listbox.bind('<Control-End>', lambda event: self.select(len(self.model) - 1))
+        self.listbox.bind('<MouseWheel>', lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.listbox.bind('<Button-4>', lambda event: self.scroll(-1))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll(1))
+        self.render()
+
+    def __getattr__(self, name):
+        return getattr(self.listbox, name)
+
+    def visible(self, index):
+        return index is not None and self.top <= index < self.top + self.height
+
+    def render(self):
+        self.listbox.delete(0, tk.END)
+        rows = self.model.names[self.top:self.top + self.height]
+        if rows:
+            self.listbox.insert(0, *rows)
+        for row, name in enumerate(rows):
+            if self.flagged(name):
+                self.listbox.itemconfig(row, foreground=self.flag_color)
+        if self.visible(self.selected):
+            self.listbox.selection_set(self.selected - self.top)
+        if self.visible(self.active):
+            self.listbox.activate(self.active - self.top)
+
+    def clamp_top(self):
+        self.top = max(0, min(self.top, len(self.model) - self.height))
+
+    def scroll(self, rows):
+        self.top += rows
+        self.clamp_top()
+        self.render()
+        return "break"
+
+    def select(self, index):
+        if not len(self.model):
+            return "break"
+        index = max(0, min(index, len(self.model) - 1))
+        self.selected = index
+        self.active = index
+        self.see(index)
+        return "break"
+
+    def move(self, delta):
+        return self.select(self.active + delta)
+
+    def click(self, event):
+        self.listbox.focus_set()
+        return self.select(self.nearest(event.y))
+
+    def curselection(self):
+        if self.selected is None:
+            return ()
+        return (self.selected,)
+
+    def selection_clear(self, first=0, last=None):
+        self.selected = None
+        self.render()
+
+    def selection_set(self, index):
+        self.selected = index
+        self.render()
+
+    def activate(self, index):
+        self.active = index
+        self.render()
+
+    def see(self, index):
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.height:
+            self.top = index - self.height + 1
+        self.clamp_top()
+        self.render()
+
+    def size(self):
+        return len(self.model)
+
+    def nearest(self, y):
+        if not len(self.model):
+            return -1
+        return min(self.top + self.listbox.nearest(y), len(self.model) - 1)
+
+    def bbox(self, index):
+        if not self.visible(index):
+            return None
+        return self.listbox.bbox(index - self.top)
+
+    def reset(self, selected=None):
+        self.selected = selected
+        self.active = selected or 0
+        self.clamp_top()
+        if selected is not None:
+            self.see(selected)
+        else:
+            self.render()
+
+    def inserted(self, pos):
+        if self.selected is not None and self.selected >= pos:
+            self.selected += 1
+        if self.active >= pos:
+            self.active += 1
+        if pos < self.top:
+            self.top += 1
+        elif pos < self.top + self.height:
+            self.render()
+
+    def removed(self, pos):
+        if self.selected == pos:
+            self.selected = None
+        elif self.selected is not None and self.selected > pos:
+            self.selected -= 1
+        if self.active > pos:
+            self.active -= 1
+        if pos < self.top:
+            self.top -= 1
+        top = self.top
+        self.clamp_top()
+        if pos < self.top + self.height or top != self.top:
+            self.render()
+
+    def moved(self, old_pos, new_pos):
+        follow = self.selected == old_pos
+        self.removed(old_pos)
+        self.inserted(new_pos)
+        if follow:
+            self.selected = new_pos
+            self.active = new_pos
+            self.see(new_pos)
+
+
+class HoverPreview:
+    def __init__(self, listbox, text_for, bootstyle, delay=40):
+        self.listbox = listbox
+        self.text_for = text_for
+        self.bootstyle = bootstyle
+        self.delay = delay
+        self.window = None
+        self.label = None
+        self.index = -1
+        self.pending = None
+        self.last = None
+        self.listbox.bind('<Motion>', self.motion)
+        self.listbox.bind('<Leave>', self.hide)
+
+    def motion(self, event):
+        self.last = (event.y, event.x_root, event.y_root)
+        if self.pending is None:
+            self.pending = self.listbox.after(self.delay, self.refresh)
+
+    def refresh(self):
+        self.pending = None
+        y, x_root, y_root = self.last
+        size = self.listbox.size()
+        if not size:
+            self.hide()
+            return
+        last_row = self.listbox.bbox(size - 1)
+        if last_row is not None and y > last_row[1] + last_row[3]:
+            self.hide()
+            return
+        index = self.listbox.nearest(y)
+        if index != self.index:
+            self.index = index
+            self.show(self.text_for(index), x_root + 15, y_root + 15)
+
+    def show(self, text, x, y):
+        if self.window is None:
+            self.window = tk.Toplevel(self.listbox)
+            self.window.wm_overrideredirect(True)
+            self.label = ttk.Label(self.window, bootstyle=(self.bootstyle, INVERSE), justify=tk.LEFT)
+            self.label.pack(padx=2, pady=2)
+        self.label.config(text=text)
+        self.window.wm_geometry(f"+{x}+{y}")
+        self.window.deiconify()
+
+    def hide(self, event=None):
+        if self.pending is not None:
+            self.listbox.after_cancel(self.pending)
+            self.pending = None
+        self.index = -1
+        if self.window is not None:
+            self.window.withdraw()
+
+    def set_bootstyle(self, bootstyle):
+        self.bootstyle = bootstyle
+        if self.label is not None:
+            self.label.config(bootstyle=(self.bootstyle, INVERSE))
+
+
+class Marquee:
+    def __init__(self, master, scheduler, bootstyle, width=350, font="bold", speed=40, fps=30, gap=60, delay=1000, pause=5000):
+        self.scheduler = scheduler
+        self.font = tkfont.Font(root=master, font=font)
+        self.width = width
+        self.height = self.font.metrics("linespace") + 6
+        self.speed = speed
+        self.interval = round(1000 / fps)
+        self.gap = gap
+        self.delay = delay
+        self.pause = pause
+        self.canvas = tk.Canvas(master, width=width, height=self.height, highlightthickness=0, borderwidth=0)
+        self.items = ()
+        self.span = 0
+        self.offset = 0.0
+        self.last = None
+        self.set_bootstyle(bootstyle)
+
+    def set_bootstyle(self, bootstyle):
+        colors = ttk.Style().colors
+        self.foreground = colors.selectfg
+        self.canvas.config(background=colors.get(bootstyle))
+        self.canvas.itemconfigure("title", fill=self.foreground)
+
+    def set_text(self, text):
+        self.stop()
+        self.canvas.delete("title")
+        y = self.height / 2
+        text_width = self.font.measure(text)
+        if text_width <= self.width:
+            self.items = (self.canvas.create_text(self.width / 2, y, text=text, anchor=CENTER, font=self.font, fill=self.foreground, tags="title"),)
+            return
+        self.span = text_width + self.gap
+        self.items = tuple(self.canvas.create_text(x, y, text=text, anchor=W, font=self.font, fill=self.foreground, tags="title") for x in (0, self.span))
+        self.offset = 0.0
+        self.last = None
+        self.scheduler.every("marquee", self.interval, self.step, delay=self.delay)
+
+    def step(self):
+        now = self.scheduler.now()
+        elapsed = self.interval if self.last is None else min(now - self.last, 2 * self.interval)
+        self.last = now
+        self.offset += self.speed * elapsed / 1000
+        rest = None
+        if self.offset >= self.span:
+            self.offset = 0.0
+            self.last = None
+            rest = self.pause
+        y = self.height / 2
+        self.canvas.coords(self.items[0], -self.offset, y)
+        self.canvas.coords(self.items[1], self.span - self.offset, y)
+        return rest
+
+    def start(self):
+        if len(self.items) > 1 and not self.scheduler.running("marquee"):
+            self.last = None
+            self.scheduler.every("marquee", self.interval, self.step)
+
+    def stop(self):
+        self.scheduler.cancel("marquee")
+
+
+class WidgetRegistry:
+    def __init__(self, translations, language, bootstyle):
+        self.translations = translations
+        self.language = language
+        self.bootstyle = bootstyle
+        self.styles = {}
+        self.labels = {}
+        self.tips = {}
+        self.tip_keys = {}
+
+    def text_for(self, key):
+        return self.translations[self.language][key]
+
+    def themed(self, widget, pattern="{}"):
+        self.styles[widget] = pattern
+
+    def label(self, widget, key):
+        self.labels[widget] = key
+
+    def tooltip(self, widget, key=None, text=None):
+        tip = self.tips.get(widget)
+        if tip is None:
+            tip = self.tips[widget] = ToolTip(widget, text="", bootstyle=self.bootstyle)
+        self.tip_keys[widget] = key
+        tip.text = self.text_for(key) if key else text
+
+    def update(self, language=None, bootstyle=None):
+        if bootstyle is not None:
+            self.bootstyle = bootstyle
+            for widget, pattern in self.styles.items():
+                widget.config(bootstyle=pattern.format(bootstyle))
+        if language is not None:
+            self.language = language
+            for widget, key in self.labels.items():
+                widget.config(text=self.text_for(key))
+        for widget, tip in self.tips.items():
+            tip.bootstyle = self.bootstyle
+            if self.tip_keys[widget]:
+                tip.text = self.text_for(self.tip_keys[widget])
+
+
 class AppDisplay:
-    def __init__(self, root, URL_FILE, CACHE_FILE, SETTINGS_FILE, TRANSLATIONS_FILE, ICON_16, ICON_32, MUSIC_GIF):
+    def __init__(self, root, URL_FILE, CACHE_FILE, DB_FILE, SETTINGS_FILE, TRANSLATIONS_FILE, ICON_16, ICON_32, MUSIC_GIF, profiler=None):
         logger.info("Uruchomiono odtwarzacz")
         self.root = root
+        self.profiler = profiler or StartupProfiler()
 
-        self.data = FileHandling(URL_FILE)
-        self.cache_data = CacheHandling(CACHE_FILE)
+        self.storage = Storage(DB_FILE)
+        self.data = FileHandling(URL_FILE, self.storage)
+        self.library = self.data.model
+        self.profiler.mark("library load")
         self.settings = SettingsConfig(SETTINGS_FILE)
+        self.extractors = ExtractorPool()
+        self.cache_data = CacheHandling(CACHE_FILE, self.storage, self.extractors)
+        self.audio_store = AudioStore(AUDIO_DIR, self.storage, quota_mb=self.settings.show().get("offline_quota_mb", 1024), enabled=self.settings.show().get("offline_cache", False))
+        self.scheduler = UiScheduler(self.root)
+        self.resolver = StreamResolver(self.root, self.cache_data, self.audio_store)
+        self.health = HealthScanner(self.root, self.scheduler, self.library, self.storage, self.extractors) if self.settings.show().get("health_scan", True) else None
         self.language = self.settings.show()["lang"]
         with open(TRANSLATIONS_FILE, "r", encoding="utf-8") as f:
             self.translations = json.load(f)
@@ -164,6 +2459,10 @@ class AppDisplay:
         self.lanchange.add_command(label="en", command=lambda: self.change_language("en"))
         self.lanchange.add_command(label="pl", command=lambda: self.change_language("pl"))
         self.filemenu.add_cascade(label=self.translations[self.language]["lang_change"], menu=self.lanchange)
+        self.filemenu.add_command(label=self.translations[self.language]["import_title"], command=self.open_import_window)
+        self.filemenu.add_command(label=self.translations[self.language]["performance"], command=self.open_performance_window)
+        self.offline_cache = tk.BooleanVar(value=self.audio_store.enabled)
+        self.filemenu.add_checkbutton(label=self.translations[self.language]["offline_cache"], variable=self.offline_cache, command=self.toggle_offline_cache)
         self.filemenu.add_separator()
         self.filemenu.add_command(label=self.translations[self.language]["exit"], command=root.quit)
         self.menubar.add_cascade(label=self.translations[self.language]["file"], menu=self.filemenu)
@@ -177,60 +2476,55 @@ class AppDisplay:
         self.right_click_menu.add_command(label=self.translations[self.language]["change_name"])
         self.right_click_menu.add_command(label=self.translations[self.language]["del"])
 
-        self.player = mpv.MPV(ytdl=True, video=False, cache=True)
+        self.engine = PlayerEngine(self.root, self.library, self.settings, self.resolver, self.storage, self.health)
+        self.widgets = WidgetRegistry(self.translations, self.language, self.boot_stl)
 
         self.gif_file = MUSIC_GIF
-        self.info = Image.open(self.gif_file)
+        self.current_frame = 0
+        self.gif = FrameCache(self.root, self.gif_file, on_ready=self.show_static_frame)
 
         self.header = tk.Frame(self.root)
         self.header.grid(row=0, column=0, padx=5, pady=5)
 
-        self.frames = self.info.n_frames
-        self.photoimage_objects = []
-        for i in range(self.frames):
-            self.obj = tk.PhotoImage(file=self.gif_file, format=f"gif -index {i}")
-            self.photoimage_objects.append(self.obj.subsample(10))
-
-        self.static_img = self.obj.subsample(10)
-
-        self.gif_label = tk.Label(self.header, width=40, image=self.static_img)
+        self.gif_label = tk.Label(self.header, width=40, image=self.gif.static)
         self.gif_label.grid(row=0, column=1, pady=2)
 
         self.text_info1 = tk.Label(self.header, text=self.translations[self.language]["now_playing"])
         self.text_info1.grid(row=1, column=1, pady=2)
-
-        self.s_index = 0
-        self.width = 30
+        self.widgets.label(self.text_info1, "now_playing")
 
         self.title = self.translations[self.language]["select"]
-        self.text_info2 = ttk.Label(self.header, text=self.title, bootstyle=f"inverse-{self.boot_stl}", font=("bold"), wraplength=350)
-        self.text_info2.grid(row=2, column=1, pady=2)
-        ToolTip(self.text_info2, text=self.translations[self.language]["select"], bootstyle=self.boot_stl)
+        self.marquee = Marquee(self.header, self.scheduler, self.boot_stl)
+        self.marquee.canvas.grid(row=2, column=1, pady=2)
+        self.marquee.set_text(self.title)
+        self.widgets.tooltip(self.marquee.canvas, "select")
 
         self.list_space = tk.Frame(self.root)
         self.list_space.grid(row=1, column=0, padx=5, pady=5)
 
-        self.mylist = tk.Listbox(self.list_space, width=50, height=5)
-        for i, (k, v) in enumerate(self.data.show().items()):
-            self.mylist.insert(i, k)
+        self.mylist = PlaylistView(self.list_space, self.library, width=50, height=5)
         self.mylist.bind('<Double-1>', self.play_audio)
         self.mylist.bind('<Return>', self.play_audio)
         self.mylist.bind('<space>', self.toggle_play_pause)
         self.mylist.bind("<Button-3><ButtonRelease-3>", self.do_popup1)
         self.mylist.grid(row=0, column=0, columnspan=2, rowspan=2, padx=5, pady=5)
         self.mylist.configure(highlightcolor="black")
-        self.lListOver = [-1,None,None]
-        self.mylist.bind('<Motion>', self.f_coord)
-        self.mylist.bind('<Leave>', self.f_resetnListOver)
+        self.hover = HoverPreview(self.mylist, self.hover_text, self.boot_stl)
+        if self.health is not None:
+            self.mylist.flagged = lambda name: not self.health.available(name)
         self.mylist.bind('<Right>', "break")
 
         self.open_window_button = ttk.Button(self.list_space, text=self.translations[self.language]["add"], bootstyle=self.boot_stl, takefocus=False, command=self.open_new_window)
         self.open_window_button.grid(row=0, column=2, pady=2)
-        ToolTip(self.open_window_button, text=self.translations[self.language]["add_new"], bootstyle=self.boot_stl)
+        self.widgets.themed(self.open_window_button)
+        self.widgets.label(self.open_window_button, "add")
+        self.widgets.tooltip(self.open_window_button, "add_new")
 
         self.del_button = ttk.Button(self.list_space, text=self.translations[self.language]["del"], bootstyle=self.boot_stl, takefocus=False, command=self.delete_url)
         self.del_button.grid(row=1, column=2, pady=2)
-        ToolTip(self.del_button, text=self.translations[self.language]["del_track"], bootstyle=self.boot_stl)
+        self.widgets.themed(self.del_button)
+        self.widgets.label(self.del_button, "del")
+        self.widgets.tooltip(self.del_button, "del_track")
 
         self.progress_bar = tk.Frame(self.root)
         self.progress_bar.grid(row=2, column=0, padx=5, pady=5)
@@ -245,79 +2539,77 @@ class AppDisplay:
         self.progress_scale = ttk.Scale(self.progress_bar, variable=self.progress_val, bootstyle=self.boot_stl, orient=tk.HORIZONTAL, from_=0, to=100, length=240)
         self.progress_scale.bind("<ButtonRelease-1>", self.change_progress)
         self.progress_scale.bind('<Button-1>', self.set_value)
+        self.progress_scale.bind('<B1-Motion>', self.show_seek_time)
         self.progress_scale.grid(row=0, column=1, padx=5, pady=5)
+        self.widgets.themed(self.progress_scale)
 
         self.end_time = tk.Label(self.progress_bar, text="00:00")
         self.end_time.grid(row=0, column=2, padx=5, pady=5)
 
-        self.update_progress()
+        self.label_texts = {}
+        self.progress_shown = None
 
         self.buttons = tk.Frame(self.root)
         self.buttons.grid(row=3, column=0, padx=5, pady=5)
 
         self.prev_button = ttk.Button(self.buttons, text="⏮️", bootstyle=self.boot_stl, takefocus=False, command=self.play_previous)
         self.prev_button.grid(row=0, column=1, padx=5, pady=5)
-        ToolTip(self.prev_button, text=self.translations[self.language]["previous"], bootstyle=self.boot_stl)
+        self.widgets.themed(self.prev_button)
+        self.widgets.tooltip(self.prev_button, "previous")
 
         self.stop_button = ttk.Button(self.buttons, text="⏹", bootstyle=self.boot_stl, takefocus=False, command=self.stop_audio)
         self.stop_button.grid(row=0, column=2, padx=5, pady=5)
-        ToolTip(self.stop_button, text=self.translations[self.language]["stop"], bootstyle=self.boot_stl)
+        self.widgets.themed(self.stop_button)
+        self.widgets.tooltip(self.stop_button, "stop")
 
         self.play_button = ttk.Button(self.buttons, text="▶️", bootstyle=self.boot_stl, takefocus=False, command=self.toggle_play_pause)
         self.play_button.grid(row=0, column=3, padx=5, pady=5)
-        ToolTip(self.play_button, text=self.translations[self.language]["play"], bootstyle=self.boot_stl)
+        self.widgets.themed(self.play_button)
+        self.widgets.tooltip(self.play_button, "play")
 
         self.next_button = ttk.Button(self.buttons, text="⏭️", bootstyle=self.boot_stl, takefocus=False, command=self.play_next)
         self.next_button.grid(row=0, column=4, padx=5, pady=5)
-        ToolTip(self.next_button, text=self.translations[self.language]["next"], bootstyle=self.boot_stl)
+        self.widgets.themed(self.next_button)
+        self.widgets.tooltip(self.next_button, "next")
 
         self.toggle_buttons = tk.Frame(self.root)
         self.toggle_buttons.grid(row=4, column=0, padx=5, pady=5)
 
-        if self.settings.show()["shuffle"] == 'shuffle_off':
-            self.shuffle_mode = False
+        if not self.engine.shuffle_mode:
             self.toggle_shuffle_text = 'SHUFFLE OFF'
         else:
-            self.shuffle_mode = True
             self.toggle_shuffle_text = 'SHUFFLE ON'
 
         self.shuffle_button = ttk.Button(self.toggle_buttons, text=self.toggle_shuffle_text, bootstyle=self.boot_stl, takefocus=False, command=self.toggle_shuffle)
         self.shuffle_button.grid(row=0, column=0, padx=3, pady=5)
-        ToolTip(self.shuffle_button, text=self.translations[self.language][self.settings.show()["shuffle"]], bootstyle=self.boot_stl)
-
-        if self.settings.show()["play_mode"] == 'repeat_mode':
-            self.play_mode = "repeat"
-            self.play_mode_text = 'REPEAT MODE'
-        elif self.settings.show()["play_mode"] == 'next_mode':
-            self.play_mode = "next"
-            self.play_mode_text = 'NEXT MODE'
-        else:
-            self.play_mode = "stop"
-            self.play_mode_text = 'STOP MODE'
+        self.widgets.themed(self.shuffle_button)
+        self.widgets.tooltip(self.shuffle_button, self.settings.show()["shuffle"])
+
+        self.play_mode_text = PlayerEngine.MODE_LABELS[self.engine.play_mode]
 
         self.play_mode_button = ttk.Button(self.toggle_buttons, text=self.play_mode_text, bootstyle=self.boot_stl, takefocus=False, command=self.toggle_play_mode)
         self.play_mode_button.grid(row=0, column=1, padx=3, pady=5)
-        ToolTip(self.play_mode_button, text=self.translations[self.language][self.settings.show()["play_mode"]], bootstyle=self.boot_stl)
+        self.widgets.themed(self.play_mode_button)
+        self.widgets.tooltip(self.play_mode_button, f'{self.engine.play_mode}_mode')
 
         self.volume_frame = tk.Frame(self.root)
         self.volume_frame.grid(row=5, column=0, padx=5, pady=5)
 
-        if self.settings.show()["mute"] == 'mute_off':
-            self.player.mute = False
+        if not self.engine.player.mute:
             self.mute_button_text = 'MUTE OFF'
         else:
-            self.player.mute = True
             self.mute_button_text = 'MUTE ON'
 
         self.mute_button = ttk.Button(self.volume_frame, text=self.mute_button_text, bootstyle=self.boot_stl, takefocus=False, command=self.mute)
         self.mute_button.grid(row=0, column=0)
-        ToolTip(self.mute_button, text=self.translations[self.language][self.settings.show()["mute"]], bootstyle=self.boot_stl)
+        self.widgets.themed(self.mute_button)
+        self.widgets.tooltip(self.mute_button, self.settings.show()["mute"])
         self.volume_before_mute = self.settings.show()["volume"]
-        self.player.volume = self.volume_before_mute
         self.val = tk.IntVar(value=self.volume_before_mute)
         self.volume_scale = ttk.Scale(self.volume_frame, bootstyle=self.boot_stl, variable=self.val, from_=0, to=100, command=self.set_volume)
-        self.volume_scale.set(self.player.volume)
+        self.volume_scale.set(self.engine.player.volume)
         self.volume_scale.grid(row=0, column=1, padx=5, pady=5)
+        self.widgets.themed(self.volume_scale)
         self.val.trace('w', self.change_volume)
         self.scale_lbl = tk.Label(self.volume_frame, text=str(self.volume_before_mute))
         self.scale_lbl.grid(row=0, column=2, padx=5, pady=5)
@@ -326,39 +2618,64 @@ class AppDisplay:
         self.error.set("")
         self.label = tk.Label(textvariable=self.error, width=30, height=2)
         self.label.grid(row=7, column=0, columnspan=3, pady=2)
-        self.clear_error_text()
+        self.error.trace("w", self.clear_error_text)
+
+        self.engine.subscribe("resolving", self.on_resolving)
+        self.engine.subscribe("track", self.on_track)
+        self.engine.subscribe("state", self.on_state)
+        self.engine.subscribe("progress", self.update_progress)
+        self.engine.subscribe("error", self.on_engine_error)
+        self.engine.subscribe("cancelled", self.show_select)
+        self.engine.subscribe("mode", self.on_play_mode)
+        self.engine.subscribe("shuffle", self.on_shuffle)
+        self.engine.subscribe("mute", self.on_mute)
+        self.engine.subscribe("volume", self.on_volume)
+        self.engine.subscribe("rename", self.on_rename)
 
         self.on_top = False
-        self.text_loop = None
-
-    def f_coord(self, *d):
-        xEnrPos, yEnrPos = d[0].x, d[0].y
-        idxOver = self.mylist.nearest(yEnrPos)
-        tLast = self.mylist.bbox(self.mylist.size() - 1)
-        if tLast is not None:
-        	yDownLast = tLast[1] + tLast[3]
-        	if yEnrPos > yDownLast:
-        		if self.lListOver[1] is not None:
-        			self.f_resetnListOver(None)
-        		return None
-        if idxOver != self.lListOver[0]:
-        	sX, sY = str(self.root.winfo_pointerx() + 15), str(self.root.winfo_pointery() + 15)
-        	if self.lListOver[1] is not None: self.lListOver[1].destroy()
-        	self.lListOver[1] = tk.Toplevel(self.root)
-        	self.lListOver[1].wm_geometry("+" + sX + "+" + sY)
-        	self.lListOver[1].wm_overrideredirect(True)
-        	ttk.Label(self.lListOver[1], text=[k for i, (k, v) in enumerate(self.data.show().items())][idxOver],
-        			bootstyle=(self.boot_stl, INVERSE), justify=tk.LEFT).pack(padx=2, pady=2)
-        	self.lListOver[0] = idxOver
-        return None
+        self.profiler.mark("ui build")
+        self.root.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        self.profiler.mark("first paint")
+        self.profiler.wait_for("mpv init", "cache load", "yt-dlp import")
+        threading.Thread(target=self.load_player, name="mpv-init", daemon=True).start()
+        self.resolver.run(self.timed(self.cache_data.load), lambda started: self.background_done("cache load", started), lambda error: self.background_failed("cache load", error))
+        self.resolver.run(self.timed(self.import_yt_dlp), lambda started: self.background_done("yt-dlp import", started), lambda error: self.background_failed("yt-dlp import", error))
+        if self.health is not None:
+            self.health.subscribe(self.on_health)
+            self.health.start()
+
+    def timed(self, func):
+        def run():
+            started = time.perf_counter()
+            func()
+            return started
+        return run
+
+    def import_yt_dlp(self):
+        self.extractors.warm("stream")
+
+    def background_done(self, phase, started):
+        self.profiler.record(phase, started)
+        self.profiler.done(phase)
+
+    def background_failed(self, phase, error):
+        logger.error(f"Blad podczas uruchamiania ({phase})", exc_info=error)
+        self.profiler.done(phase)
+
+    def load_player(self):
+        started = time.perf_counter()
+        try:
+            player = self.engine.player.create()
+        except Exception as error:
+            self.root.after(0, lambda: self.background_failed("mpv init", error))
+            return
+        self.root.after(0, lambda: self.on_player_ready(player, started))
 
-    def f_resetnListOver(self, *d):
-        if self.lListOver[1] is None: return None
-        self.lListOver[0] = -1
-        self.lListOver[1].destroy()
-        self.lListOver[1] = None
-        self.lListOver[2] = None
-        return None
+    def on_player_ready(self, player, started):
+        self.engine.attach(player, rate=self.settings.show().get("progress_rate", 4))
+        self.background_done("mpv init", started)
 
     def do_popup1(self, event=None):
         e_widget = event.widget
@@ -387,49 +2704,62 @@ class AppDisplay:
         return 'break'
 
     def change_progress(self, *args):
-        if self.player.duration:
-            new_time = (self.progress_val.get() / 100) * self.player.duration
-            if new_time >= self.player.duration:
-                if not self.seeking:
-                    self.seeking = False
-            else:
-                self.player.seek(new_time, reference="absolute")
+        if self.engine.player.duration:
+            self.engine.seek((self.progress_val.get() / 100) * self.engine.player.duration)
         self.seeking = False
+        self.progress_shown = None
 
 
-    def update_progress(self):
-        if self.player.time_pos is not None and self.player.duration is not None:
-            if self.player.duration >= 3600:
-                string = "%H:%M:%S"
-            else:
-                string = "%M:%S"
-            start = time.strftime(string, time.gmtime(self.player.time_pos))
-            end = time.strftime(string, time.gmtime(self.player.duration))
-            change_pos = self.player.time_pos / self.player.duration * 100 + 0.8
-            val = self.player.duration / 100 * int(self.progress_scale.get())
-            self.scale_progress = time.strftime(string, time.gmtime(val))
-            self.end_time.config(text=end)
-            if not self.seeking:
-                self.progress_val.set(change_pos)
-                self.start_time.config(text=start)
-            else:
-                self.start_time.config(text=self.scale_progress)
-            if val >= self.player.duration - 0.5 and not self.seeking:
-                self.on_track_end()
-        self.root.after(10, self.update_progress)
-
-    def animation(self, current_frame=0):
-        self.image = self.photoimage_objects[current_frame]
-        self.gif_label.configure(image=self.image)
-        current_frame = current_frame + 1
-        if current_frame == self.frames:
-            current_frame = 0
-        self.loop = self.root.after(20, lambda: self.animation(current_frame))
+    def show_seek_time(self, event=None):
+        if self.engine.progress is None:
+            return
+        self.engine.on_progress(self.engine.progress.values["time-pos"], self.engine.progress.values["duration"])
+
+    def set_label(self, label, text):
+        if self.label_texts.get(str(label)) != text:
+            self.label_texts[str(label)] = text
+            label.config(text=text)
+
+    def set_progress(self, value):
+        if self.progress_shown != value:
+            self.progress_shown = value
+            self.progress_val.set(value)
+
+    def update_progress(self, time_pos, duration):
+        if duration >= 3600:
+            string = "%H:%M:%S"
+        else:
+            string = "%M:%S"
+        self.set_label(self.end_time, time.strftime(string, time.gmtime(duration)))
+        if not self.seeking:
+            self.set_progress(round(time_pos / duration * 100 + 0.8, 1))
+            self.set_label(self.start_time, time.strftime(string, time.gmtime(time_pos)))
+        else:
+            val = duration / 100 * int(self.progress_scale.get())
+            self.set_label(self.start_time, time.strftime(string, time.gmtime(val)))
+
+    def show_static_frame(self):
+        if not self.scheduler.running("animation"):
+            self.gif_label.configure(image=self.gif.static)
+
+    def start_animation(self):
+        self.current_frame = 0
+        self.scheduler.every("animation", 20, self.animation, delay=0)
+        self.marquee.start()
+        logger.info("Rozpoczeto animacje gif")
+
+    def animation(self):
+        if self.current_frame < len(self.gif):
+            self.image = self.gif.get(self.current_frame)
+            self.gif_label.configure(image=self.image)
+            self.current_frame += 1
+            if self.current_frame == len(self.gif) and self.gif.ready:
+                self.current_frame = 0
 
     def stop_animation(self):
-        if self.loop:
+        self.marquee.stop()
+        if self.scheduler.cancel("animation"):
             logger.info("Zatrzymano animacje gif")
-            self.root.after_cancel(self.loop)
 
     def set_flag(self, event=None):
         self.on_top = False
@@ -477,12 +2807,173 @@ class AppDisplay:
 
             self.label_sec_win = tk.Label(self.new_window, textvariable=self.error_sec_win, width=40, height=2)
             self.label_sec_win.grid(row=3, column=1, sticky=tk.S, pady=2)
-            self.clear_error_text_sec_win()
+            self.error_sec_win.trace("w", self.clear_error_text_sec_win)
             
             self.new_window.bind('<Destroy>', self.set_flag)
 
         self.on_top = True
 
+    def open_import_window(self):
+        if not self.on_top:
+            self.import_window = tk.Toplevel(self.root)
+            self.import_window.title(self.translations[self.language]["import_title"])
+            window_width = 520
+            window_height = 150
+            self.screen_width = self.root.winfo_screenwidth()
+            self.screen_height = self.root.winfo_screenheight()
+            x = (self.screen_width/2) - (window_width/2)
+            y = (self.screen_height/2) - (window_height/2)
+            self.import_window.geometry('%dx%d+%d+%d' % (window_width, window_height, x, y))
+            self.import_window.resizable(False,False)
+
+            self.new_right_click_menu = tk.Menu(self.root, tearoff=0)
+            self.new_right_click_menu.add_command(label=self.translations[self.language]["cut"])
+            self.new_right_click_menu.add_command(label=self.translations[self.language]["copy"])
+            self.new_right_click_menu.add_command(label=self.translations[self.language]["paste"])
+            self.new_right_click_menu.add_separator()
+            self.new_right_click_menu.add_command(label=self.translations[self.language]["select_all"])
+
+            ttk.Label(self.import_window, bootstyle=self.boot_stl, text=self.translations[self.language]["import_source"]).grid(row=0, column=0, sticky=tk.W, pady=2)
+            self.import_entry = ttk.Entry(self.import_window, bootstyle=self.boot_stl, width=40)
+            self.import_entry.grid(row=0, column=1, pady=2)
+            self.import_entry.bind("<Button-3><ButtonRelease-3>", self.do_popup2)
+            self.browse_button = ttk.Button(self.import_window, bootstyle=self.boot_stl, takefocus=False, text=self.translations[self.language]["browse"], command=self.browse_import_file)
+            self.browse_button.grid(row=0, column=2, pady=2)
+
+            self.import_progress = ttk.Progressbar(self.import_window, bootstyle=self.boot_stl, mode="determinate", length=300)
+            self.import_progress.grid(row=1, column=1, pady=5)
+
+            self.import_button = ttk.Button(self.import_window, text=self.translations[self.language]["import"], bootstyle=self.boot_stl, takefocus=False, command=self.start_import)
+            self.import_button.grid(row=2, column=1, pady=2)
+
+            self.import_status = tk.StringVar()
+            self.import_status.set("")
+            tk.Label(self.import_window, textvariable=self.import_status, width=45, height=2).grid(row=3, column=1, sticky=tk.S, pady=2)
+
+            self.importer = None
+            self.import_window.bind('<Destroy>', self.close_import_window)
+
+        self.on_top = True
+
+    def close_import_window(self, event=None):
+        if event is not None and event.widget is not self.import_window:
+            return
+        if self.importer is not None:
+            self.importer.cancel()
+        self.on_top = False
+
+    def browse_import_file(self):
+        path = filedialog.askopenfilename(parent=self.import_window, filetypes=[("CSV / TXT", "*.csv *.txt"), ("*", "*.*")])
+        if path:
+            self.import_entry.delete(0, tk.END)
+            self.import_entry.insert(END, path)
+
+    def start_import(self):
+        source = self.import_entry.get().strip()
+        if not source:
+            self.import_status.set(self.translations[self.language]["enter_url"])
+            return
+        if not os.path.isfile(source) and not YOUTUBE_REGEX.match(source):
+            self.import_status.set(self.translations[self.language]["inc_yt_link"])
+            logger.info("Niepoprawny link do YouTube")
+            return
+        logger.info(f"Import z: {source}")
+        self.import_button.config(state="disabled")
+        self.import_progress.config(value=0)
+        self.importer = BulkImporter(self.root, self.library, self.extractors)
+        self.importer.start(source, self.on_import_progress, self.on_import_done, self.on_import_fail)
+
+    def on_import_progress(self, done, total):
+        if self.importer is None or self.importer.cancelled:
+            return
+        self.import_progress.config(value=done / total * 100 if total else 100)
+        self.import_status.set(self.translations[self.language]["import_progress"].format(done=done, total=total))
+
+    def on_import_done(self, tracks, skipped):
+        if self.importer is None or self.importer.cancelled:
+            return
+        cs = self.mylist.curselection()
+        selected = self.library.name_at(cs[0]) if cs else None
+        batch = []
+        names = set()
+        for name, url in tracks:
+            if self.library.has_url(url):
+                skipped += 1
+                continue
+            name = name[:100]
+            unique_name = name
+            number = 2
+            while unique_name in self.library or unique_name in names:
+                unique_name = f"{name} ({number})"
+                number += 1
+            names.add(unique_name)
+            batch.append((unique_name, url))
+        added = self.data.add_many(batch)
+        self.engine.shuffle.add(*[name for name, url in batch])
+        self.hover.hide()
+        self.mylist.reset(self.library.index_of(selected) if selected else None)
+        logger.info(f"Zaimportowano {added} utworow, pominieto {skipped}")
+        self.import_progress.config(value=100)
+        self.import_status.set(self.translations[self.language]["import_done"].format(added=added, skipped=skipped))
+        self.import_button.config(state="normal")
+
+    def on_import_fail(self, error):
+        logger.error("Import nie powiodl sie", exc_info=error)
+        if self.importer is None or self.importer.cancelled:
+            return
+        self.import_status.set(self.translations[self.language]["import_fail"])
+        self.import_button.config(state="normal")
+
+    def open_performance_window(self):
+        if self.scheduler.running("performance"):
+            self.performance_window.lift()
+            return
+        self.performance_window = tk.Toplevel(self.root)
+        self.performance_window.title(self.translations[self.language]["performance"])
+        self.performance_window.resizable(False,False)
+
+        columns = ("count", "p50", "p95", "max")
+        self.performance_table = ttk.Treeview(self.performance_window, bootstyle=self.boot_stl, columns=columns, height=10)
+        self.performance_table.heading("#0", text=self.translations[self.language]["span"])
+        self.performance_table.column("#0", width=150)
+        for column in columns:
+            self.performance_table.heading(column, text=column if column == "count" else f"{column} ms")
+            self.performance_table.column(column, width=70, anchor=tk.E)
+        self.performance_table.grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+
+        self.performance_info = tk.Label(self.performance_window, justify=tk.LEFT)
+        self.performance_info.grid(row=1, column=0, columnspan=2, sticky=tk.W, padx=5)
+
+        ttk.Button(self.performance_window, text=self.translations[self.language]["export_json"], bootstyle=self.boot_stl, takefocus=False, command=lambda: self.export_trace(False)).grid(row=2, column=0, pady=5)
+        ttk.Button(self.performance_window, text=self.translations[self.language]["export_trace"], bootstyle=self.boot_stl, takefocus=False, command=lambda: self.export_trace(True)).grid(row=2, column=1, pady=5)
+
+        self.performance_window.bind('<Destroy>', self.close_performance_window)
+        self.scheduler.every("performance", 1000, self.refresh_performance, delay=0)
+
+    def close_performance_window(self, event=None):
+        if event is None or event.widget is self.performance_window:
+            self.scheduler.cancel("performance")
+
+    def refresh_performance(self):
+        self.performance_table.delete(*self.performance_table.get_children())
+        for name, stats in tracer.stats().items():
+            self.performance_table.insert("", tk.END, text=name, values=(stats["count"], f"{stats['p50']:.1f}", f"{stats['p95']:.1f}", f"{stats['max']:.1f}"))
+        ratio = lambda value: "-" if value is None else f"{value:.0%}"
+        gap = self.engine.transitions.average()
+        self.performance_info.config(text="\n".join([
+            self.translations[self.language]["cache_hits"].format(stream=ratio(self.cache_data.hit_ratio()), offline=ratio(self.audio_store.hit_ratio())),
+            self.translations[self.language]["offline_saved"].format(saved=f"{self.audio_store.saved_mb():.1f}"),
+            self.translations[self.language]["transition_gap"].format(gap="-" if gap is None else f"{gap:.0f} ms"),
+            self.translations[self.language]["active_tasks"].format(count=self.scheduler.active()),
+            self.translations[self.language]["settings_writes"].format(count=self.settings.writes)
+        ]))
+
+    def export_trace(self, chrome):
+        extension = ".trace.json" if chrome else ".json"
+        path = filedialog.asksaveasfilename(parent=self.performance_window, defaultextension=extension, filetypes=[("JSON", "*.json")])
+        if path:
+            tracer.export(path, chrome=chrome)
+
     def get_video_title(self):
         url = self.e1.get().strip()
         if url:
@@ -492,22 +2983,39 @@ class AppDisplay:
                 logger.info("Niepoprawny link do YouTube")
                 return
 
-            if url in self.data.show().values():
+            if self.library.has_url(url):
                 self.error_sec_win.set(self.translations[self.language]["already_under"])
-                logger.info(f"Podany link jest juz na liscie pod nazwa '{list(filter(lambda key: self.data.show()[key] == url, self.data.show()))[0]}'")
+                logger.info(f"Podany link jest juz na liscie pod nazwa '{self.library.name_for_url(url)}'")
                 return
 
-            ydl_opts = {"quiet": True}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                res = info.get("title", self.translations[self.language]["unknown_title"])
-                self.e2.delete(0, tk.END)
-                self.e2.insert(END, res)
+            self.error_sec_win.set(self.translations[self.language]["resolving"])
+            self.check_button.config(state="disabled")
+            self.resolver.run(self.extract_title, self.on_video_title, self.on_video_title_fail, url)
         else:
             self.error_sec_win.set(self.translations[self.language]["enter_url"])
             logger.info("Wprowadz URL")
             return
 
+    def extract_title(self, url):
+        with self.extractors.session("metadata") as ydl:
+            info = ydl.extract_info(url, download=False)
+        return info.get("title", self.translations[self.language]["unknown_title"])
+
+    def on_video_title(self, res):
+        if not self.on_top or not self.e2.winfo_exists():
+            return
+        self.check_button.config(state="normal")
+        self.error_sec_win.set("")
+        self.e2.delete(0, tk.END)
+        self.e2.insert(END, res)
+
+    def on_video_title_fail(self, error):
+        logger.error("Nie udalo sie pobrac tytulu", exc_info=error)
+        if not self.on_top or not self.e2.winfo_exists():
+            return
+        self.check_button.config(state="normal")
+        self.error_sec_win.set(self.translations[self.language]["unknown_title"])
+
     def character_limit(self):
         if len(self.entry_text.get()) > 100:
             self.entry_text.set(self.entry_text.get()[:100])
@@ -528,9 +3036,9 @@ class AppDisplay:
             logger.info("Niepoprawny link do YouTube")
             return
 
-        if url in self.data.show().values():
+        if self.library.has_url(url):
             self.error_sec_win.set(self.translations[self.language]["already_under"])
-            logger.info(f"Podany link jest juz na liscie pod nazwa '{list(filter(lambda key: self.data.show()[key] == url, self.data.show()))[0]}'")
+            logger.info(f"Podany link jest juz na liscie pod nazwa '{self.library.name_for_url(url)}'")
             return
 
         if not name:
@@ -538,17 +3046,17 @@ class AppDisplay:
             logger.info("Wprowadz nazwe")
             return
 
-        if name in self.data.show():
+        if name in self.library:
             self.error_sec_win.set(self.translations[self.language]["already_on"].format(name=name))
             logger.info(f"Nazwa '{name}' jest juz na liscie")
             return
 
-        self.data.add_new(name, url)
+        pos = self.data.add_new(name, url)
+        self.engine.shuffle.add(name)
+        self.hover.hide()
         self.error_sec_win.set(self.translations[self.language]["new_track_added"])
         logger.info(f"Dodano '{name}' do listy")
-        self.mylist.delete(0, tk.END)
-        for i, (k, v) in enumerate(self.data.show().items()):
-            self.mylist.insert(i, k)
+        self.mylist.inserted(pos)
         self.e1.delete(0, tk.END)
         self.e2.delete(0, tk.END)
 
@@ -558,7 +3066,7 @@ class AppDisplay:
             self.error.set(self.translations[self.language]["no_track_sel"])
             logger.info("Nie wybrano zadnego utworu")
             return None
-        name = list(self.data.show().keys())[cs[0]]
+        name = self.library.name_at(cs[0])
         if not self.on_top:
             self.change_name_window = tk.Toplevel(self.root)
             self.change_name_window.title(self.translations[self.language]["change_name"])
@@ -607,20 +3115,28 @@ class AppDisplay:
 
             self.label_sec_win = tk.Label(self.change_name_window, textvariable=self.error_sec_win, width=40, height=2)
             self.label_sec_win.grid(row=3, column=1, sticky=tk.S, pady=2)
-            self.clear_error_text_sec_win()
+            self.error_sec_win.trace("w", self.clear_error_text_sec_win)
             
             self.change_name_window.bind('<Destroy>', self.set_flag)
 
         self.on_top = True
 
     def change_name(self, name):
-        new_name = self.entry_text.get()
-        self.data.change_name(new_name, name)
+        new_name = self.entry_text.get().strip()
+        if not new_name:
+            self.error_sec_win.set(self.translations[self.language]["enter_name"])
+            logger.info("Wprowadz nazwe")
+            return
+        if new_name in self.library:
+            self.error_sec_win.set(self.translations[self.language]["already_on"].format(name=new_name))
+            logger.info(f"Nazwa '{new_name}' jest juz na liscie")
+            return
+        old_pos, new_pos = self.data.change_name(new_name, name)
+        self.engine.rename(name, new_name)
+        self.hover.hide()
         self.error_sec_win.set(self.translations[self.language]["change_name_succesful"])
         logger.info(f"Pomyślnie zmieniono nazwę!")
-        self.mylist.delete(0, tk.END)
-        for i, (k, v) in enumerate(self.data.show().items()):
-            self.mylist.insert(i, k)
+        self.mylist.moved(old_pos, new_pos)
         self.on_top = False
         self.change_name_window.destroy()
 
@@ -657,245 +3173,173 @@ class AppDisplay:
 
     def on_yes(self, cs):
         self.error.set(self.translations[self.language]["track_del_confirm"])
-        logger.info(f"Usunieto '{list(self.data.show().keys())[cs[0]]}' z listy")
-        if self.title == list(self.data.show().keys())[cs[0]]:
+        name = self.library.name_at(cs[0])
+        logger.info(f"Usunieto '{name}' z listy")
+        if self.title == name:
             self.stop_audio()
         self.data.remove(cs[0])
-        self.mylist.delete(cs)
+        self.engine.remove(name)
+        self.hover.hide()
+        self.mylist.removed(cs[0])
         self.on_top = False
         self.delete_window.destroy()
 
-    def update(self):
-        if self.text_loop:
-            self.root.after_cancel(self.text_loop)
-        double_text = self.title + '        ' + self.title
-        display_text = double_text[self.s_index:self.s_index + self.width]
-        self.text_info2.config(text=display_text)
-        self.s_index += 1
-        if self.s_index >= len(self.title) + 8:
-            self.s_index = 0
-            self.text_loop = self.root.after(len(self.title)*80+5000, self.update)
-        else:
-            self.text_loop = self.root.after(80, self.update)
-
-    def clear_error_text(self):
-        self.error.set("")
-        self.root.after(6000, self.clear_error_text)
+    def clear_error_text(self, *args):
+        if self.error.get():
+            self.scheduler.once("clear_error", 6000, lambda: self.error.set(""), pausable=False)
 
-    def clear_error_text_sec_win(self):
-        self.error_sec_win.set("")
-        self.root.after(6000, self.clear_error_text_sec_win)
+    def clear_error_text_sec_win(self, *args):
+        error = self.error_sec_win
+        if error.get():
+            self.scheduler.once("clear_error_sec_win", 6000, lambda: error.set(""), pausable=False)
 
-    def fetch_audio_url(self):
+    def selected_name(self):
         cs = self.mylist.curselection()
         if not cs:
-            self.error.set(self.translations[self.language]["no_track_sel"])
-            logger.info("Nie wybrano zadnego utworu")
             return None
-        url = self.data.show()[list(self.data.show().keys())[cs[0]]]
-        logger.info(f"Link do video: {url}")
-        logger.info(f"Odtwarzanie utworu: {list(self.data.show().keys())[cs[0]]}")
-        try:
-            info = self.cache_data.get_song_info(url)
-            self.title = list(filter(lambda key: self.data.show()[key] == url, self.data.show()))[0]
-            ToolTip(self.text_info2, text=self.title, bootstyle=self.boot_stl)
-            self.text_info2.config(text=self.title[0:self.width])
-            if len(self.title) > self.width:
-                self.root.after(1000, self.update)
-            else:
-                self.text_info2.config(text=self.title)
-            return info.get('url', None)
-        except Exception as e:
-            self.error.set(self.translations[self.language]["audio_download_fail"])
-            logger.exception("Nie udalo sie pobrac audio")
+        return self.library.name_at(cs[0])
+
+    def select_track(self, name):
+        index = self.library.index_of(name)
+        if index is not None:
+            self.mylist.selection_clear(0, tk.END)
+            self.mylist.selection_set(index)
+            self.mylist.activate(index)
+            self.mylist.see(index)
+
+    def on_health(self, name, available):
+        self.mylist.render()
+
+    def hover_text(self, index):
+        name = self.library.name_at(index)
+        duration = self.health.duration(name) if self.health is not None else None
+        if not duration:
+            return name
+        return f"{name} ({time.strftime('%H:%M:%S' if duration >= 3600 else '%M:%S', time.gmtime(duration))})"
+
+    def on_resolving(self, name):
+        self.select_track(name)
+        self.set_progress(0)
+        self.marquee.set_text(self.translations[self.language]["resolving"])
+
+    def on_track(self, name):
+        self.select_track(name)
+        self.set_progress(0)
+        self.show_title(name)
+
+    def show_title(self, name):
+        self.title = name
+        self.widgets.tooltip(self.marquee.canvas, text=self.title)
+        self.marquee.set_text(self.title)
+
+    def on_rename(self, name, new_name):
+        if self.title != name:
+            return
+        if self.engine.current_name == new_name:
+            self.show_title(new_name)
+            if self.engine.state != "playing":
+                self.marquee.stop()
+        else:
+            self.title = new_name
 
-    def toggle_play_pause(self, event=None):
-        if self.player.pause:
-            self.resume_audio()
-        elif self.player.playback_time:
+    def show_select(self):
+        self.marquee.set_text(self.translations[self.language]["select"])
+
+    def on_engine_error(self, key):
+        self.error.set(self.translations[self.language][key])
+        if key == "audio_download_fail":
+            self.show_select()
+
+    def on_state(self, state):
+        if state == "playing":
+            self.start_animation()
+            self.play_button.config(text="⏸")
+            self.widgets.tooltip(self.play_button, "pause")
+        elif state == "paused":
             self.stop_animation()
-            self.pause_audio()
+            self.play_button.config(text="▶️")
+            self.widgets.tooltip(self.play_button, "play")
         else:
-            self.play_audio()
-    
-    def play_audio(self, event=None):
-        self.stop_audio()
-        self.progress_val.set(0)
-        audio_url = self.fetch_audio_url()
-        if audio_url:
-            logger.info(f"Link do audio: {audio_url}")
-            self.player.play(audio_url)
-            self.animation(current_frame=0)
-            logger.info("Rozpoczeto animacje gif")
-            self.player.pause = False
-            self.play_button.config(text="⏸")
-            ToolTip(self.play_button, text=self.translations[self.language]["pause"], bootstyle=self.boot_stl)
+            self.show_select()
+            self.widgets.tooltip(self.marquee.canvas, "select")
+            self.stop_animation()
+            self.set_label(self.start_time, "00:00")
+            self.set_label(self.end_time, "00:00")
+            self.set_progress(0)
+            self.play_button.config(text="▶️")
+            self.widgets.tooltip(self.play_button, "play")
 
-    def pause_audio(self):
-        logger.info("Wstrzymano odtwarzanie")
-        self.player.pause = True
-        self.stop_animation()
-        self.play_button.config(text="▶️")
-        ToolTip(self.play_button, text=self.translations[self.language]["play"], bootstyle=self.boot_stl)
+    def toggle_play_pause(self, event=None):
+        self.engine.toggle_play_pause(self.selected_name())
 
-    def resume_audio(self):
-        logger.info("Wznowiono odtwarzanie")
-        self.player.pause = False
-        self.animation(current_frame=0)
-        logger.info("Rozpoczeto animacje gif")
-        self.play_button.config(text="⏸")
-        ToolTip(self.play_button, text=self.translations[self.language]["pause"], bootstyle=self.boot_stl)
+    def play_audio(self, event=None):
+        self.engine.play(self.selected_name())
 
     def toggle_play_mode(self):
-        modes = ["repeat", "next", "stop"]
-        mode_labels = {"repeat": "REPEAT MODE", "next": "NEXT MODE", "stop": "STOP MODE"}
-        current_index = modes.index(self.play_mode)
-        self.play_mode = modes[(current_index + 1) % len(modes)]
-        logger.info(mode_labels[self.play_mode])
-        self.play_mode_button.config(text=mode_labels[self.play_mode])
-        self.settings.overwrite_data(key="play_mode", new_value=f'{self.play_mode}_mode')
-        ToolTip(self.play_mode_button, text=self.translations[self.language][f'{self.play_mode}_mode'], bootstyle=self.boot_stl)
+        self.engine.toggle_play_mode()
 
-    def on_track_end(self):
-        self.stop_animation()
-        if self.play_mode == "repeat":
-            self.play_audio()
-        elif self.play_mode == "next":
-            self.play_next()
-        elif self.play_mode == "stop":
-            self.stop_audio()
+    def on_play_mode(self, play_mode):
+        self.play_mode_button.config(text=PlayerEngine.MODE_LABELS[play_mode])
+        self.widgets.tooltip(self.play_mode_button, f'{play_mode}_mode')
 
     def toggle_shuffle(self):
-        self.shuffle_mode = not self.shuffle_mode
-        shuffle_mode_text = "SHUFFLE ON" if self.shuffle_mode else "SHUFFLE OFF"
-        logger.info(shuffle_mode_text)
-        self.shuffle_button.config(text=shuffle_mode_text)
-        if self.shuffle_mode:
-            ToolTip(self.shuffle_button, text=self.translations[self.language]["shuffle_on"], bootstyle=self.boot_stl)
-            self.settings.overwrite_data(key="shuffle", new_value="shuffle_on")
-        else:
-            ToolTip(self.shuffle_button, text=self.translations[self.language]["shuffle_off"], bootstyle=self.boot_stl)
-            self.settings.overwrite_data(key="shuffle", new_value="shuffle_off")
+        self.engine.toggle_shuffle()
+
+    def on_shuffle(self, shuffle_mode):
+        self.shuffle_button.config(text="SHUFFLE ON" if shuffle_mode else "SHUFFLE OFF")
+        self.widgets.tooltip(self.shuffle_button, "shuffle_on" if shuffle_mode else "shuffle_off")
 
     def play_next(self):
-        logger.info("Nastepny utwor")
-        cs = self.mylist.curselection()
-        if not cs:
-            return
-        current_index = cs[0]
-        if self.shuffle_mode:
-            next_index = current_index
-            while next_index == current_index:
-                next_index = random.randint(0, self.mylist.size() - 1)
-        else:
-            next_index = (current_index + 1) % self.mylist.size()
-        self.mylist.selection_clear(0, tk.END)
-        self.mylist.selection_set(next_index)
-        self.mylist.activate(next_index)
-        self.play_audio()
+        self.engine.play_next(self.selected_name())
 
     def play_previous(self, event=None):
-        logger.info("Poprzedni utwor")
-        cs = self.mylist.curselection()
-        if not cs:
-            return  
-        current_index = cs[0]
-        prev_index = (current_index - 1) % self.mylist.size()
-        self.mylist.selection_clear(0, tk.END)
-        self.mylist.selection_set(prev_index)
-        self.mylist.activate(prev_index)
-        self.play_audio()
-
-    def change_volume(self, *args):        
+        self.engine.play_previous(self.selected_name())
+
+    def change_volume(self, *args):
         volume = int(self.volume_scale.get())
-        self.settings.overwrite_data(key="volume", new_value=volume)
-        self.player.volume = volume
+        self.engine.set_volume(volume)
         self.scale_lbl.config(text=volume)
 
     def set_volume(self, volume):
-        volume = int(float(volume))
-        self.player.volume = volume
-        if self.player.mute and volume > 0:
-            self.player.mute = False
-            self.settings.overwrite_data(key="mute", new_value="mute_off")
-            self.mute_button.config(text="MUTE OFF")
-            logger.info("MUTE OFF")
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_off"], bootstyle=self.boot_stl)
+        self.engine.set_volume(int(float(volume)))
+
+    def on_volume(self, volume):
+        if int(self.volume_scale.get()) != volume:
+            self.val.set(volume)
+            self.scale_lbl.config(text=volume)
+
+    def on_mute(self, muted):
+        self.mute_button.config(text="MUTE ON" if muted else "MUTE OFF")
+        self.widgets.tooltip(self.mute_button, "mute_on" if muted else "mute_off")
 
     def mute(self):
-        if self.player.mute:
-            self.player.mute = False
-            self.settings.overwrite_data(key="mute", new_value="mute_off")
-            self.mute_button.config(text="MUTE OFF")
-            logger.info("MUTE OFF")
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_off"], bootstyle=self.boot_stl)
+        if self.engine.player.mute:
+            self.engine.set_mute(False)
             self.val.set(self.volume_before_mute)
             self.scale_lbl.config(text=self.volume_before_mute)
             self.change_volume()
         else:
-            self.volume_before_mute = self.player.volume
-            self.player.mute = True
-            self.settings.overwrite_data(key="mute", new_value="mute_on")
-            self.mute_button.config(text="MUTE ON")
-            logger.info("MUTE ON")
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_on"], bootstyle=self.boot_stl)
+            self.volume_before_mute = self.engine.player.volume
+            self.engine.set_mute(True)
             self.val.set(0)
             self.scale_lbl.config(text="0")
             self.change_volume()
 
     def stop_audio(self):
-        if self.player.playback_time:
-            logger.info("Zatrzymano odtwarzanie")
-            self.player.stop()
-            self.player.pause = False
-            self.text_info2.config(text=self.translations[self.language]["select"])
-            ToolTip(self.text_info2, text=self.translations[self.language]["select"], bootstyle=self.boot_stl)
-            self.stop_animation()
-            self.start_time.config(text="00:00")
-            self.end_time.config(text="00:00")
-            self.progress_val.set(0)
-            self.play_button.config(text="▶️")
-            ToolTip(self.play_button, text=self.translations[self.language]["play"], bootstyle=self.boot_stl)
+        self.engine.stop()
+
+    def toggle_offline_cache(self):
+        self.audio_store.enabled = self.offline_cache.get()
+        self.settings.overwrite_data(key="offline_cache", new_value=self.audio_store.enabled)
+        logger.info(f"Pamiec offline: {'wlaczona' if self.audio_store.enabled else 'wylaczona'}")
 
     def change_style(self, style):
         self.boot_stl = style
         self.settings.overwrite_data(key="theme", new_value=style)
 
-        self.text_info2.config(bootstyle=f"inverse-{self.boot_stl}")
-        self.open_window_button.config(bootstyle=self.boot_stl)
-        self.del_button.config(bootstyle=self.boot_stl)
-        self.progress_scale.config(bootstyle=self.boot_stl)
-        self.prev_button.config(bootstyle=self.boot_stl)
-        self.stop_button.config(bootstyle=self.boot_stl)
-        self.play_button.config(bootstyle=self.boot_stl)
-        self.next_button.config(bootstyle=self.boot_stl)
-        self.shuffle_button.config(bootstyle=self.boot_stl)
-        self.play_mode_button.config(bootstyle=self.boot_stl)
-        self.mute_button.config(bootstyle=self.boot_stl)
-        self.volume_scale.config(bootstyle=self.boot_stl)
-
-        if not self.player.playback_time and not self.player.pause:
-            ToolTip(self.text_info2, text=self.translations[self.language]["select"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.text_info2, text=self.title, bootstyle=self.boot_stl)
-        if self.player.pause == True:
-            ToolTip(self.play_button, text=self.translations[self.language]["play"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.play_button, text=self.translations[self.language]["pause"], bootstyle=self.boot_stl)
-        ToolTip(self.stop_button, text=self.translations[self.language]["stop"], bootstyle=self.boot_stl)
-        ToolTip(self.next_button, text=self.translations[self.language]["next"], bootstyle=self.boot_stl)
-        ToolTip(self.prev_button, text=self.translations[self.language]["previous"], bootstyle=self.boot_stl)
-        if self.player.mute == True:
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_on"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_off"], bootstyle=self.boot_stl)
-        ToolTip(self.open_window_button, text=self.translations[self.language]["add_new"], bootstyle=self.boot_stl)
-        ToolTip(self.del_button, text=self.translations[self.language]["del_track"], bootstyle=self.boot_stl)
-        if self.shuffle_mode:
-            ToolTip(self.shuffle_button, text=self.translations[self.language]["shuffle_on"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.shuffle_button, text=self.translations[self.language]["shuffle_off"], bootstyle=self.boot_stl)
-        ToolTip(self.play_mode_button, text=self.translations[self.language][f'{self.play_mode}_mode'], bootstyle=self.boot_stl)
+        self.widgets.update(bootstyle=self.boot_stl)
+        self.marquee.set_bootstyle(self.boot_stl)
+        self.hover.set_bootstyle(self.boot_stl)
 
         self.error.set(f"{self.translations[self.language]["theme_change_confirm"]} {style.title()}")
         logger.info(f"Zmieniono motyy na {style.title()}")
@@ -907,45 +3351,58 @@ class AppDisplay:
         self.menubar.entryconfigure(0, label=self.translations[self.language]["file"])
         self.filemenu.entryconfigure(0, label=self.translations[self.language]["theme_change"])
         self.filemenu.entryconfigure(1, label=self.translations[self.language]["lang_change"])
-        self.filemenu.entryconfigure(3, label=self.translations[self.language]["exit"])
-
-        self.text_info1.config(text=self.translations[self.language]["now_playing"])
-        if not self.player.playback_time and not self.player.pause:
-            self.text_info2.config(text=self.translations[self.language]["select"])
-            ToolTip(self.text_info2, text=self.translations[self.language]["select"], bootstyle=self.boot_stl)
-
+        self.filemenu.entryconfigure(2, label=self.translations[self.language]["import_title"])
+        self.filemenu.entryconfigure(3, label=self.translations[self.language]["performance"])
+        self.filemenu.entryconfigure(4, label=self.translations[self.language]["offline_cache"])
+        self.filemenu.entryconfigure(6, label=self.translations[self.language]["exit"])
 
-        self.open_window_button.config(text=self.translations[self.language]["add"])
-        self.del_button.config(text=self.translations[self.language]["del"])
+        if not self.engine.player.playback_time and not self.engine.player.pause:
+            self.show_select()
 
         self.right_click_menu.entryconfigure(0, label=self.translations[self.language]["copy"])
         self.right_click_menu.entryconfigure(2, label=self.translations[self.language]["play_pause"])
         self.right_click_menu.entryconfigure(4, label=self.translations[self.language]["change_name"])
         self.right_click_menu.entryconfigure(5, label=self.translations[self.language]["del"])
 
-        if self.player.pause == True:
-            ToolTip(self.play_button, text=self.translations[self.language]["play"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.play_button, text=self.translations[self.language]["pause"], bootstyle=self.boot_stl)
-        ToolTip(self.stop_button, text=self.translations[self.language]["stop"], bootstyle=self.boot_stl)
-        ToolTip(self.next_button, text=self.translations[self.language]["next"], bootstyle=self.boot_stl)
-        ToolTip(self.prev_button, text=self.translations[self.language]["previous"], bootstyle=self.boot_stl)
-        if self.player.mute == True:
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_on"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.mute_button, text=self.translations[self.language]["mute_off"], bootstyle=self.boot_stl)
-        ToolTip(self.open_window_button, text=self.translations[self.language]["add_new"], bootstyle=self.boot_stl)
-        ToolTip(self.del_button, text=self.translations[self.language]["del_track"], bootstyle=self.boot_stl)
-        if self.shuffle_mode:
-            ToolTip(self.shuffle_button, text=self.translations[self.language]["shuffle_on"], bootstyle=self.boot_stl)
-        else:
-            ToolTip(self.shuffle_button, text=self.translations[self.language]["shuffle_off"], bootstyle=self.boot_stl)
-        ToolTip(self.play_mode_button, text=self.translations[self.language][f'{self.play_mode}_mode'], bootstyle=self.boot_stl)
-
+        self.widgets.update(language=self.language)
 
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = AppDisplay(root, URL_FILE, CACHE_FILE, SETTINGS_FILE, TRANSLATIONS_FILE, ICON_16, ICON_32, MUSIC_GIF)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="Music Player")
+    parser.add_argument("--profile-startup", action="store_true", help="print time spent in each startup phase")
+    parser.add_argument("--daemon", action="store_true", help="play the library without opening a window")
+    parser.add_argument("--track", help="track to start from in daemon mode")
+    parser.add_argument("--control-port", type=int, help="accept JSON control commands on 127.0.0.1:PORT")
+    parser.add_argument("--control-socket", help="accept JSON control commands on a Unix socket")
+    parser.add_argument("--trace-file", help="write recorded timing spans as a Chrome trace on exit")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="minimum level written to log.log")
+    parser.add_argument("--log-json", action="store_true", help="write log.log as one JSON object per line")
+    args = parser.parse_args()
+    setup_logging(args.log_level, args.log_json)
+
+    if args.daemon:
+        PlayerDaemon(track=args.track, control_port=args.control_port, control_socket=args.control_socket).run()
+    else:
+        profiler = StartupProfiler(enabled=args.profile_startup)
+        import_gui()
+        profiler.mark("gui import")
+        root = tk.Tk()
+        profiler.mark("tk init")
+        app = AppDisplay(root, URL_FILE, CACHE_FILE, DB_FILE, SETTINGS_FILE, TRANSLATIONS_FILE, ICON_16, ICON_32, MUSIC_GIF, profiler=profiler)
+        control = None
+        if args.control_port is not None or args.control_socket:
+            control = ControlServer(root, app.engine, port=args.control_port, path=args.control_socket)
+            control.start()
+        root.mainloop()
+        if control is not None:
+            control.close()
+        if app.health is not None:
+            app.health.shutdown()
+        app.resolver.shutdown()
+        app.audio_store.shutdown()
+        app.extractors.close()
+        app.settings.flush()
+        app.storage.close()
+    if args.trace_file:
+        tracer.export(args.trace_file, chrome=True)
     logger.info("Zakonczono dzialanie programu")